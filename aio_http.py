@@ -0,0 +1,222 @@
+import asyncio
+import itertools
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import partial
+from urllib.parse import urlparse
+import requests
+from requests.structures import CaseInsensitiveDict
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+import http_client
+from circuit import breaker
+from config import logger
+from metrics import METRICS
+import parsing
+from ratelimit import RATE_LIMITER
+from spans import log_span
+
+# Statuses Cloudflare answers with while it wants a challenge solved
+CHALLENGE_STATUSES = {403, 429, 503}
+
+# Keyword arguments the aiohttp path understands; anything else goes through http_client
+_AIOHTTP_KWARGS = {'headers', 'timeout', 'allow_redirects', 'stream_until'}
+
+# BeautifulSoup parsing runs here so it never blocks the event loop
+PARSE_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix='parse')
+
+class AsyncResponse:
+    """The parts of a requests.Response the scrapers use, filled from an aiohttp response."""
+    __slots__ = ('url', 'status_code', 'headers', 'content', 'encoding', 'elapsed')
+
+    def __init__(self, url, status_code, headers, content, encoding, elapsed):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.encoding = encoding
+        self.elapsed = elapsed
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding or 'utf-8', errors='replace')
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Error for url: {self.url}", response=self)
+
+_SESSIONS = {}
+_INFLIGHT = {}
+
+def _session(site_key):
+    """Return the aiohttp session for a site, rebuilding it if its domain or loop changed."""
+    pool = http_client.get_pool(site_key)
+    loop = asyncio.get_running_loop()
+    entry = _SESSIONS.get(site_key)
+    if entry is not None and entry[:2] == (pool.domain, loop) and not entry[2].closed:
+        return entry[2]
+    if entry is not None and entry[1] is loop:
+        asyncio.ensure_future(entry[2].close())
+
+    connector = aiohttp.TCPConnector(limit_per_host=http_client.MAX_CONCURRENT_PAGES)
+    session = aiohttp.ClientSession(connector=connector, headers=http_client.BROWSER_HEADERS)
+    _SESSIONS[site_key] = (pool.domain, loop, session)
+    logger.debug("Created aiohttp session for %s (%s)", site_key, pool.domain)
+    return session
+
+def _use_sync_client(site_key, kwargs):
+    return aiohttp is None or bool(http_client.TRANSPORT_ADAPTERS) or not set(kwargs) <= _AIOHTTP_KWARGS
+
+async def _sync_get(site_key, url, **kwargs):
+    return await asyncio.wrap_future(http_client.submit(site_key, url, **kwargs))
+
+async def _fetch(site_key, url, **kwargs):
+    host = urlparse(url).hostname
+    breaker(host).before_request()
+    delay = RATE_LIMITER.reserve(site_key, url)
+    if delay > 0:
+        await asyncio.sleep(delay)
+
+    session = _session(site_key)
+    # Reuse whatever Cloudflare clearance the cloudscraper sessions have solved
+    cookies, user_agent = http_client.get_pool(site_key).clearance()
+    headers = dict(kwargs.get('headers') or {})
+    if user_agent:
+        headers['User-Agent'] = user_agent
+    started = time.perf_counter()
+    status = None
+    ok = False
+    try:
+        async with session.get(
+            url,
+            headers=headers,
+            cookies=cookies,
+            allow_redirects=kwargs.get('allow_redirects', True),
+            timeout=aiohttp.ClientTimeout(total=kwargs.get('timeout', 10)),
+        ) as response:
+            elapsed = timedelta(seconds=time.perf_counter() - started)
+            if kwargs.get('stream_until') and response.status == 200:
+                content = await _read_until(site_key, response, kwargs['stream_until'])
+            else:
+                content = await response.read()
+            result = AsyncResponse(str(response.url), response.status, CaseInsensitiveDict(response.headers), content, response.charset, elapsed)
+        challenged = (site_key in http_client.CLOUDSCRAPER_SITES and result.status_code in CHALLENGE_STATUSES
+                      and 'cloudflare' in result.headers.get('Server', '').lower())
+        # A challenge means the site is up; cloudscraper deals with it below
+        status = result.status_code
+        ok = result.status_code < 500 or challenged
+    except asyncio.TimeoutError as e:
+        raise requests.Timeout(f"Timed out fetching {url}") from e
+    except aiohttp.ClientError as e:
+        raise requests.ConnectionError(str(e)) from e
+    finally:
+        http_client.record_request(site_key, host, time.perf_counter() - started, status, ok)
+
+    if challenged:
+        logger.info("Cloudflare challenge on %s; retrying through cloudscraper", url)
+        METRICS.inc('cloudflare_challenges_total', site=site_key)
+        with METRICS.timer('stage_seconds', site=site_key, stage='challenge'):
+            return await _sync_get(site_key, url, **kwargs)
+    return result
+
+async def _read_until(site_key, response, containers):
+    """Read an aiohttp body only until every container has closed; see http_client._read_until."""
+    watcher = parsing.ContainerWatcher(containers)
+    chunks = []
+    stopped = False
+    async for chunk in response.content.iter_chunked(http_client.STREAM_CHUNK_SIZE):
+        chunks.append(chunk)
+        if watcher.feed_bytes(chunk):
+            stopped = True
+            break
+    content = b''.join(chunks)
+    # aiohttp hands out decoded bytes, which only match Content-Length for identity encoding
+    content_length = response.content_length if not response.headers.get('Content-Encoding') else None
+    read = len(content)
+    if stopped:
+        drained = await _drain(response, content_length - read if content_length else None)
+        if drained is None:
+            # Drop the connection rather than download a long rest of the body into it
+            response.close()
+        else:
+            read += drained
+    http_client.record_stream(site_key, str(response.url), read, content_length, stopped)
+    return content
+
+async def _drain(response, left, limit=http_client.STREAM_DRAIN_LIMIT):
+    """http_client._drain for aiohttp: bytes drained if the body ended within limit, else None."""
+    if left is not None and left > limit:
+        return None
+    drained = 0
+    while drained <= limit:
+        chunk = await response.content.read(http_client.STREAM_CHUNK_SIZE)
+        if not chunk:
+            return drained
+        drained += len(chunk)
+    return None
+
+async def get(site_key, url, **kwargs):
+    """Async counterpart of http_client.get, sharing its rate limits and cookies.
+
+    Requests go out over aiohttp when it is installed; Cloudflare challenges,
+    replay transports and unusual keyword arguments go through the threaded
+    client instead. Identical concurrent GETs share one request.
+    """
+    kwargs.setdefault('timeout', 10)
+    if _use_sync_client(site_key, kwargs):
+        return await _sync_get(site_key, url, **kwargs)
+
+    key = (url, tuple(sorted((kwargs.get('headers') or {}).items())), kwargs.get('stream_until'))
+    task = _INFLIGHT.get(key)
+    if task is None:
+        task = _INFLIGHT[key] = asyncio.ensure_future(_fetch(site_key, url, **kwargs))
+        task.add_done_callback(lambda _: _INFLIGHT.pop(key, None))
+    else:
+        logger.debug("Coalesced GET %s", url)
+    # Shielded so one cancelled caller does not fail the others sharing the request
+    return await asyncio.shield(task)
+
+async def run_parser(parse, *args):
+    """Run a parsing callback on PARSE_EXECUTOR and return its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(PARSE_EXECUTOR, partial(parse, *args))
+
+def timed(fn, *args):
+    """Call fn(*args) and return (result, seconds taken)."""
+    started = time.perf_counter()
+    return fn(*args), time.perf_counter() - started
+
+async def crawl(site_key, urls, parse_page, collect, window=http_client.MAX_CONCURRENT_PAGES, first_page=1, **kwargs):
+    """Async counterpart of http_client.crawl; pages are parsed off the event loop."""
+    found = 0
+    urls = iter(urls)
+    pending = deque((url, asyncio.ensure_future(get(site_key, url, **kwargs))) for url in itertools.islice(urls, window))
+    page = first_page - 1
+    try:
+        while pending:
+            url, task = pending.popleft()
+            for next_url in itertools.islice(urls, 1):
+                pending.append((next_url, asyncio.ensure_future(get(site_key, next_url, **kwargs))))
+            page += 1
+            logger.debug("Fetching page %s: %s", page, url)
+            try:
+                response = await task
+                response.raise_for_status()
+                logger.debug("Status code: %s", response.status_code)
+                more, parse_seconds = await run_parser(timed, parse_page, page, response)
+                total = len(collect())
+                log_span(site_key, url, response, parse_seconds, total - found)
+                found = total
+                if more is False:
+                    break
+            except Exception as e:
+                logger.error("Error fetching page %s: %s", page, e)
+                break
+    finally:
+        for _, task in pending:
+            task.cancel()
+    return collect()
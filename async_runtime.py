@@ -0,0 +1,32 @@
+import asyncio
+import threading
+from functools import partial
+from config import logger
+
+_LOOP = None
+_LOOP_LOCK = threading.Lock()
+
+def get_loop():
+    """Return the shared event loop, starting its thread on first use."""
+    global _LOOP
+    with _LOOP_LOCK:
+        if _LOOP is None:
+            _LOOP = asyncio.new_event_loop()
+            threading.Thread(target=_LOOP.run_forever, name='event-loop', daemon=True).start()
+            logger.info("Started asyncio event loop")
+    return _LOOP
+
+def _log_failure(future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.error(f"Background task failed: {future.exception()}")
+
+def submit(coro):
+    """Schedule a coroutine on the shared loop from any thread; returns its Future."""
+    future = asyncio.run_coroutine_threadsafe(coro, get_loop())
+    future.add_done_callback(_log_failure)
+    return future
+
+async def run_sync(fn, *args, **kwargs):
+    """Await a blocking call, such as a Telegram API request, without stalling the loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, partial(fn, *args, **kwargs))
@@ -0,0 +1,4 @@
+import os
+
+# config refuses to import without a bot token; benchmarks never talk to Telegram
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', 'benchmark')
@@ -0,0 +1,71 @@
+"""Parse time and peak memory per fixture page, before and after SoupStrainer.
+
+"before" is the original BeautifulSoup(html, 'html.parser') over the whole
+page; "after" is parsing.parse with the scraper's container list and the
+fastest installed backend. Run from the repository root:
+
+    python -m benchmarks.bench_parse [--repeat N]
+"""
+import argparse
+import logging
+import time
+import tracemalloc
+from bs4 import BeautifulSoup
+from benchmarks.fixtures import iter_fixtures
+import parsing
+from config import SITE_DEFINITIONS
+
+def _containers(site, mode):
+    """Containers engine.Site keeps on a first listing page of the given mode."""
+    definition = SITE_DEFINITIONS[site][mode]
+    return tuple(definition.get('containers', ())) + tuple(
+        container for section in definition['sections'] for container in section['containers']
+    )
+
+def _link_containers(site, step):
+    return tuple(SITE_DEFINITIONS[site]['links'][step]['containers'])
+
+# (containers passed to parsing.parse, selector the scraper then runs)
+TARGETS = {
+    ('cinevood', 'listing'): (_containers('cinevood', 'latest'), 'article.latestPost.excerpt'),
+    ('cinevood', 'search'): (_containers('cinevood', 'search'), 'article.latestPost.excerpt'),
+    ('cinevood', 'movie'): (None, 'h6'),
+    ('hdhub4u', 'listing'): (_containers('hdhub4u', 'latest'), 'ul.recent-movies li'),
+    ('hdhub4u', 'search'): (_containers('hdhub4u', 'search'), 'ul.recent-movies li'),
+    ('hdhub4u', 'movie'): (_link_containers('hdhub4u', 0), 'h3 a[href], h4 a[href]'),
+    ('hdmovie2', 'listing'): (_containers('hdmovie2', 'latest'), 'div#archive-content article.item.movies'),
+    ('hdmovie2', 'search'): (_containers('hdmovie2', 'search'), 'div.result-item'),
+    ('hdmovie2', 'movie'): (_link_containers('hdmovie2', 0), 'div.wp-content p a[href*="dwo.hair"]'),
+    ('hdmovie2', 'download'): (_link_containers('hdmovie2', 1), 'div.download-links-section p a[href]'),
+}
+
+def measure(parse, html, selector, repeat):
+    """Return (best parse ms, peak KB, matches) for a parse function."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        soup = parse(html)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    soup = parse(html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best * 1000, peak / 1024, len(soup.select(selector))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per page (best is reported)')
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    print(f"backend: {parsing.PARSER}")
+    print(f"{'site':<9} {'page':<9} {'KB':>5} {'before ms':>10} {'after ms':>9} {'before KB':>10} {'after KB':>9} {'matches':>8}")
+    for site, kind, html in iter_fixtures():
+        containers, selector = TARGETS[(site, kind)]
+        before = measure(lambda h: BeautifulSoup(h, 'html.parser'), html, selector, args.repeat)
+        after = measure(lambda h: parsing.parse(h, containers), html, selector, args.repeat)
+        matches = f"{before[2]}" if before[2] == after[2] else f"{before[2]}!={after[2]}"
+        print(f"{site:<9} {kind:<9} {len(html) // 1024:>5} {before[0]:>10.1f} {after[0]:>9.1f} {before[1]:>10.0f} {after[1]:>9.0f} {matches:>8}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""End-to-end scraper benchmarks replayed from fixture pages.
+
+Runs get_movie_titles_and_links (latest and search) and get_download_links
+for every site through the real http_client pipeline (session pool, rate
+limiter, concurrent paging, parsing) with a ReplayAdapter mounted in place
+of the network. Run from the repository root:
+
+    python -m benchmarks.bench_scrapers [--latency 0.05] [--connect-latency 0.1] [--pages 3] [--repeat 3]
+    python -m benchmarks.bench_scrapers --save baseline.json
+    python -m benchmarks.bench_scrapers --baseline baseline.json
+
+With --baseline the run exits non-zero if any case got slower than the
+threshold or started issuing more requests.
+"""
+import argparse
+import json
+import logging
+import sys
+import threading
+import time
+import tracemalloc
+from benchmarks.replay import ReplayAdapter
+from config import SITE_CONFIG, SITE_RATE_LIMITS
+import http_client
+import link_cache
+import parsing
+import title_index
+from engine import SITES
+
+class ParseTimer:
+    """Accumulate time spent inside parsing.parse across all threads."""
+
+    def __init__(self):
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+        self._parse = parsing.parse
+
+    def __call__(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self._parse(*args, **kwargs)
+        finally:
+            with self._lock:
+                self.seconds += time.perf_counter() - start
+
+    def install(self):
+        parsing.parse = self
+
+def cases(pages):
+    """Yield (site, case name, callable) for every scraper path."""
+    for site, scraper in SITES.items():
+        yield site, 'latest', lambda m=scraper: m.get_movie_titles_and_links(None, max_pages=pages)
+        yield site, 'search', lambda m=scraper: m.get_movie_titles_and_links('movie', max_pages=pages)
+        yield site, 'links', lambda m=scraper, s=site: m.get_download_links(f"https://{SITE_CONFIG[s]}/movie-1/")
+
+def run_case(func, adapter, timer, repeat):
+    """Return a dict of measurements for one scraper call."""
+    best = float('inf')
+    for _ in range(repeat):
+        adapter.requests = adapter.bytes = adapter.connections = 0
+        timer.seconds = 0.0
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        if elapsed < best:
+            best, parse_seconds, requests_issued, transferred = elapsed, timer.seconds, adapter.requests, adapter.bytes
+            connections = adapter.connections
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'wall_ms': round(best * 1000, 1),
+        'parse_ms': round(parse_seconds * 1000, 1),
+        'requests': requests_issued,
+        'connections': connections,
+        'kb': round(transferred / 1024, 1),
+        'peak_kb': round(peak / 1024),
+        'results': len(result),
+    }
+
+def compare(results, baseline, threshold):
+    """Print regressions against a saved run; return True if any were found."""
+    regressed = False
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if not previous:
+            continue
+        slower = current['wall_ms'] > previous['wall_ms'] * (1 + threshold)
+        chattier = current['requests'] > previous['requests']
+        if slower or chattier:
+            regressed = True
+            print(f"REGRESSION {key}: wall {previous['wall_ms']} -> {current['wall_ms']} ms, "
+                  f"requests {previous['requests']} -> {current['requests']}")
+    return regressed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--latency', type=float, default=0.05, help='simulated seconds per request')
+    parser.add_argument('--connect-latency', type=float, default=0.1, help='simulated extra seconds to open a connection')
+    parser.add_argument('--pages', type=int, default=3, help='listing/search pages available per query')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per case (best is reported)')
+    parser.add_argument('--save', help='write results to this JSON file')
+    parser.add_argument('--baseline', help='compare against a JSON file written by --save')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed wall-time growth vs baseline')
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.CRITICAL)
+    logging.getLogger('spans').setLevel(logging.CRITICAL)
+
+    hosts = {domain: site for site, domain in SITE_CONFIG.items()}
+    hosts['dwo.hair'] = 'hdmovie2'
+    adapter = ReplayAdapter(hosts, latency=args.latency, pages=args.pages, connect_latency=args.connect_latency)
+    http_client.TRANSPORT_ADAPTERS['https://'] = adapter
+    for site in SITE_CONFIG:
+        SITE_RATE_LIMITS[site] = {'rate': 1e6, 'burst': 1e6}
+        http_client.reset_pool(site)
+    # Every run must reach the (replayed) network, so the link cache stays empty
+    link_cache.LINK_CACHE = link_cache.LinkCache(':memory:', ttl=0, max_age=0)
+    title_index.TITLE_INDEX = title_index.TitleIndex(':memory:')
+    timer = ParseTimer()
+    timer.install()
+
+    results = {}
+    print(f"backend: {parsing.PARSER}, latency: {args.latency * 1000:.0f} ms, "
+          f"connect: {args.connect_latency * 1000:.0f} ms, pages: {args.pages}")
+    print(f"{'site':<9} {'case':<7} {'wall ms':>8} {'parse ms':>9} {'reqs':>5} {'conns':>6} {'KB':>7} {'peak KB':>8} {'results':>8}")
+    for site, name, func in cases(args.pages):
+        row = run_case(func, adapter, timer, args.repeat)
+        results[f"{site}/{name}"] = row
+        print(f"{site:<9} {name:<7} {row['wall_ms']:>8} {row['parse_ms']:>9} {row['requests']:>5} "
+              f"{row['connections']:>6} {row['kb']:>7} {row['peak_kb']:>8} {row['results']:>8}")
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            if compare(results, json.load(f), args.threshold):
+                sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""Fixture pages for the offline benchmarks.
+
+A page saved as benchmarks/fixtures/<site>_<kind>.html (for example an
+unzipped, renamed file from debug_captures/) is used as-is. Otherwise a synthetic page is
+generated that mirrors the markup each scraper selects, wrapped in the
+heavy WordPress chrome (inline scripts, menus, widgets, ads, footer) the
+real mirrors serve.
+"""
+import os
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+FIXTURE_KINDS = {
+    'cinevood': ('listing', 'search', 'movie'),
+    'hdhub4u': ('listing', 'search', 'movie'),
+    'hdmovie2': ('listing', 'search', 'movie', 'download'),
+}
+
+def _chrome_head(site):
+    scripts = ''.join(
+        f'<script id="wp-script-{i}">var cfg{i} = {{"ajax":"https://{site}.example/wp-admin/admin-ajax.php","nonce":"{i:08x}","items":[{",".join(str(n) for n in range(60))}]}};</script>\n'
+        for i in range(40)
+    )
+    styles = ''.join(f'<link rel="stylesheet" href="https://{site}.example/wp-content/themes/t/css/{i}.css?ver=6.{i}">\n' for i in range(25))
+    return f'<!DOCTYPE html><html lang="en-US"><head><meta charset="UTF-8"><title>{site}</title>\n{styles}{scripts}</head>\n'
+
+def _chrome_header(site):
+    menu = ''.join(f'<li class="menu-item menu-item-{i}"><a href="https://{site}.example/category/genre-{i}/">Genre {i}</a></li>' for i in range(120))
+    ads = '<ins class="adsbygoogle"></ins>' * 20
+    return f'<body class="home blog"><header id="site-header"><nav class="main-menu"><ul>{menu}</ul></nav></header>\n<div class="ads-top">{ads}</div>\n'
+
+def _chrome_footer(site):
+    widgets = ''.join(
+        f'<div class="widget"><h3>Widget {i}</h3><ul>'
+        + ''.join(f'<li><a href="https://{site}.example/tag/t{i}-{j}/">Tag {i}-{j}</a></li>' for j in range(30))
+        + '</ul></div>'
+        for i in range(8)
+    )
+    scripts = ''.join(f'<script>(function(){{var s{i}=document.createElement("script");s{i}.src="https://ads{i}.example/p.js";document.body.appendChild(s{i});}})();</script>\n' for i in range(60))
+    return f'<aside id="sidebar">{widgets}</aside>\n<footer id="site-footer"><p>Copyright © All rights reserved</p>{widgets}</footer>\n{scripts}</body></html>'
+
+def _page(site, main):
+    return _chrome_head(site) + _chrome_header(site) + f'<div id="page"><main id="content">{main}</main></div>\n' + _chrome_footer(site)
+
+def _cinevood(kind):
+    if kind in ('listing', 'search'):
+        posts = ''.join(
+            f'<article class="latestPost excerpt"><a href="https://cinevood.example/movie-{i}/" class="post-image"><img src="https://cinevood.example/img/{i}.jpg"></a>'
+            f'<header><h2 class="title front-view-title"><a href="https://cinevood.example/movie-{i}/">Movie {i} (2024) Hindi 720p WEB-DL</a></h2></header>'
+            f'<div class="front-view-content">Plot summary of movie {i}. ' + 'Lorem ipsum dolor sit amet. ' * 8 + '</div></article>\n'
+            for i in range(1, 21)
+        )
+        pagination = '<div class="pagination"><ul><li><a class="next" href="https://cinevood.example/page/2/">Next</a></li></ul></div>'
+        return _page('cinevood', posts + pagination)
+    sections = ''.join(
+        f'<h6>Movie (2024) {quality} [{size}]</h6>\n'
+        f'<p><a class="maxbutton-{n} maxbutton" href="https://links.example/{quality}/{n}"><span class="mb-text">Download Links</span></a>'
+        f'<a class="maxbutton-{n + 1} maxbutton" href="https://links.example/{quality}/{n + 1}"><span class="mb-text">Drive Links</span></a></p>\n'
+        for n, (quality, size) in enumerate([('480p', '400MB'), ('720p', '1GB'), ('1080p', '2.2GB'), ('2160p', '8GB')], 1)
+    )
+    body = '<div class="thecontent"><p>' + 'Storyline text. ' * 60 + '</p><center><h6>Watch Online</h6>' + sections + '</center></div>'
+    return _page('cinevood', body)
+
+def _hdhub4u(kind):
+    if kind in ('listing', 'search'):
+        items = ''.join(
+            f'<li class="thumb"><figure><a href="https://hdhub4u.example/movie-{i}/"><img src="https://hdhub4u.example/img/{i}.jpg" alt="Movie {i}"></a>'
+            f'<figcaption><a href="https://hdhub4u.example/movie-{i}/"><p>Movie {i} (2024) WEB-DL [Hindi DD5.1] 1080p 720p 480p</p></a></figcaption></figure></li>\n'
+            for i in range(1, 41)
+        )
+        pagination = '<div class="pagination-wrap"><a class="page-numbers current">1</a><a class="next page-numbers" href="https://hdhub4u.example/page/2/">Next</a></div>'
+        return _page('hdhub4u', f'<section class="home-wrapper"><ul class="recent-movies">{items}</ul></section>' + pagination)
+    links = ''.join(
+        f'<h3><a href="https://hubdrive.example/file/{n}"><em>Movie (2024) {quality} [{size}]</em></a></h3>\n'
+        f'<h4><a href="https://hubcloud.example/drive/{n}">{quality} Instant Download</a></h4>\n'
+        for n, (quality, size) in enumerate([('480p', '450MB'), ('720p', '1.2GB'), ('1080p', '2.6GB')], 1)
+    )
+    body = '<div class="page-body"><p>' + 'Storyline text. ' * 60 + '</p><h3><a href="https://youtube.example/trailer"><em>Trailer</em></a></h3>' + links + '</div>'
+    return _page('hdhub4u', body)
+
+def _hdmovie2(kind):
+    if kind == 'listing':
+        featured = ''.join(
+            f'<article class="item movies"><div class="poster"><img src="https://hdmovie2.example/f{i}.jpg"></div>'
+            f'<div class="data dfeatur"><h3><a href="https://hdmovie2.example/movies/featured-{i}/">Featured {i} (2024)</a></h3><span>2024</span></div></article>\n'
+            for i in range(1, 21)
+        )
+        archive = ''.join(
+            f'<article class="item movies"><div class="poster"><img src="https://hdmovie2.example/a{i}.jpg"><div class="rating">7.{i % 10}</div></div>'
+            f'<div class="data"><h3><a href="https://hdmovie2.example/movies/movie-{i}/">Movie {i} (2024)</a></h3><span>Jan. {i}, 2024</span></div></article>\n'
+            for i in range(1, 31)
+        )
+        return _page('hdmovie2', f'<div class="items featured">{featured}</div><div id="archive-content" class="animation-2 items">{archive}</div>'
+                     '<div class="pagination"><span class="current">1</span><a class="inactive" href="https://hdmovie2.example/movies/page/2/">2</a></div>')
+    if kind == 'search':
+        results = ''.join(
+            f'<div class="result-item"><article><div class="image"><img src="https://hdmovie2.example/s{i}.jpg"></div>'
+            f'<div class="details"><div class="title"><a href="https://hdmovie2.example/movies/result-{i}/">Result {i} (2024)</a></div>'
+            f'<div class="contenido"><p>' + 'Synopsis. ' * 20 + '</p></div></div></article></div>\n'
+            for i in range(1, 21)
+        )
+        return _page('hdmovie2', f'<div class="search-page">{results}</div><div class="pagination"><span class="current">1</span><a class="inactive" href="https://hdmovie2.example/page/2/?s=movie">2</a></div>')
+    if kind == 'movie':
+        body = ('<div class="wp-content"><p>' + 'Storyline text. ' * 60 + '</p>'
+                '<p><a href="https://dwo.hair/file/movie-2024">Download Now</a></p></div>')
+        return _page('hdmovie2', body)
+    links = ''.join(
+        f'<p><a href="https://files.example/{quality}/{n}">Movie (2024) {quality} [{size}]</a></p>\n'
+        for n, (quality, size) in enumerate([('480p', '400MB'), ('720p', '1GB'), ('1080p', '2.2GB')], 1)
+    )
+    return _page('dwo', f'<div class="download-links-section">{links}<p><a href="https://watch.example/">Watch Online</a></p></div>')
+
+_BUILDERS = {'cinevood': _cinevood, 'hdhub4u': _hdhub4u, 'hdmovie2': _hdmovie2}
+
+def load_fixture(site, kind):
+    """Return the HTML for a site's page kind, preferring a recorded page."""
+    path = os.path.join(FIXTURE_DIR, f'{site}_{kind}.html')
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            return f.read()
+    return _BUILDERS[site](kind)
+
+def iter_fixtures():
+    """Yield (site, kind, html) for every fixture page."""
+    for site, kinds in FIXTURE_KINDS.items():
+        for kind in kinds:
+            yield site, kind, load_fixture(site, kind)
@@ -0,0 +1,111 @@
+"""Transport adapter that answers scraper requests from fixture pages."""
+import io
+import re
+import threading
+import time
+from urllib.parse import urlparse
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from benchmarks.fixtures import load_fixture
+
+_PAGE_RE = re.compile(r'/page/(\d+)/')
+
+class _CountingBody(io.BytesIO):
+    """Response body that adds the bytes actually read to its adapter's total.
+
+    Read to the end, it hands its connection back to the adapter's idle
+    pool, as urllib3 does; closed before that, the connection is gone.
+    """
+
+    def __init__(self, body, adapter, host):
+        super().__init__(body)
+        self.adapter = adapter
+        self.host = host
+        self.released = False
+
+    def read(self, size=-1):
+        data = super().read(size)
+        with self.adapter._lock:
+            self.adapter.bytes += len(data)
+            if not data and size != 0 and not self.released:
+                self.released = True
+                self.adapter._idle[self.host] = self.adapter._idle.get(self.host, 0) + 1
+        return data
+
+class ReplayAdapter(BaseAdapter):
+    """Serve fixture pages for the configured site domains, with simulated latency.
+
+    hosts maps a domain to its site key; hdmovie2's download hop host maps to
+    'hdmovie2' as well. Listing and search pages past `pages` answer 404 so
+    open-ended pagination stops, as it would at the end of a real result set.
+    `bytes` counts body bytes actually read, so streamed reads that stop
+    early show up as less transfer. Keep-alive is simulated per host: a
+    request without an idle connection opens one, which costs
+    connect_latency more and is counted in `connections`.
+    """
+
+    def __init__(self, hosts, latency=0.05, pages=3, connect_latency=0.0):
+        super().__init__()
+        self.hosts = hosts
+        self.latency = latency
+        self.pages = pages
+        self.connect_latency = connect_latency
+        self.requests = 0
+        self.bytes = 0
+        self.connections = 0
+        self._idle = {}
+        self._lock = threading.Lock()
+        self._cache = {}
+
+    def route(self, url):
+        """Return (site, kind, page number) for a URL."""
+        parsed = urlparse(url)
+        site = self.hosts.get(parsed.hostname)
+        if site is None:
+            return None, None, 0
+        match = _PAGE_RE.search(parsed.path)
+        page = int(match.group(1)) if match else 1
+        if parsed.hostname == 'dwo.hair':
+            return site, 'download', 1
+        if 's=' in parsed.query or 's=' in parsed.path:
+            return site, 'search', page
+        if parsed.path in ('', '/') or parsed.path.startswith('/page/') or parsed.path.startswith('/movies/page/') or parsed.path == '/movies/':
+            return site, 'listing', page
+        return site, 'movie', 1
+
+    def _fixture(self, site, kind):
+        key = (site, kind)
+        if key not in self._cache:
+            self._cache[key] = load_fixture(site, kind).encode('utf-8')
+        return self._cache[key]
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        site, kind, page = self.route(request.url)
+        host = urlparse(request.url).hostname
+        with self._lock:
+            self.requests += 1
+            reused = self._idle.get(host, 0) > 0
+            if reused:
+                self._idle[host] -= 1
+            else:
+                self.connections += 1
+        time.sleep(self.latency if reused else self.latency + self.connect_latency)
+
+        if site is None or page > self.pages:
+            status, body = 404, b'<html><body>Not Found</body></html>'
+        else:
+            status, body = 200, self._fixture(site, kind)
+
+        response = requests.Response()
+        response.status_code = status
+        response.reason = 'OK' if status == 200 else 'Not Found'
+        response.headers = CaseInsensitiveDict({'Content-Type': 'text/html; charset=UTF-8', 'Content-Length': str(len(body))})
+        response.raw = _CountingBody(body, self, host)
+        response.encoding = 'utf-8'
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
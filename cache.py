@@ -0,0 +1,122 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from config import logger
+from models import ScrapeResult
+
+class ResultCache:
+    """Thread-safe LRU cache with a per-entry time-to-live."""
+
+    def __init__(self, max_entries=256, ttl=600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Return the cached value for key, or None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                logger.debug("Cache entry expired: %s", key)
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Store value under key, evicting the least recently used entries."""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                logger.debug("Cache entry evicted: %s", evicted)
+
+    def invalidate(self, predicate=None):
+        """Drop every entry, or only those whose key matches predicate."""
+        with self._lock:
+            if predicate is None:
+                self._entries.clear()
+                return
+            for key in [key for key in self._entries if predicate(key)]:
+                del self._entries[key]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+class SharedResultCache:
+    """ResultCache for (ScrapeResult list, has-next-page flag) pairs kept in a SQLite file, shared by every worker process.
+
+    Keys are JSON-encoded, so they must be tuples of plain values. When the
+    cache is full the entries stored longest ago go first.
+    """
+
+    def __init__(self, path, max_entries=256, ttl=600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        with self._lock, self._conn:
+            if path != ':memory:':
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS result_pages ("
+                "key TEXT PRIMARY KEY, results TEXT, more INTEGER, stored_at REAL, expires_at REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS result_pages_age ON result_pages (stored_at)")
+
+    def get(self, key):
+        """Return the cached (results, more) pair for key, or None if missing or expired."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT results, more FROM result_pages WHERE key = ? AND expires_at > ?", (json.dumps(key), time.time())
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return [ScrapeResult.from_dict(result) for result in json.loads(row[0])], bool(row[1])
+
+    def set(self, key, value, ttl=None):
+        """Store a (results, more) pair under key, evicting expired and then the oldest entries."""
+        now = time.time()
+        results, more = value
+        encoded = json.dumps([result.to_dict() for result in results])
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO result_pages (key, results, more, stored_at, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (json.dumps(key), encoded, int(bool(more)), now, now + (self.ttl if ttl is None else ttl)),
+            )
+            self._conn.execute("DELETE FROM result_pages WHERE expires_at <= ?", (now,))
+            self._conn.execute(
+                "DELETE FROM result_pages WHERE key IN (SELECT key FROM result_pages ORDER BY stored_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def invalidate(self, predicate=None):
+        """Drop every entry, or only those whose key matches predicate."""
+        with self._lock, self._conn:
+            if predicate is None:
+                self._conn.execute("DELETE FROM result_pages")
+                return
+            keys = [key for (key,) in self._conn.execute("SELECT key FROM result_pages") if predicate(tuple(json.loads(key)))]
+            self._conn.executemany("DELETE FROM result_pages WHERE key = ?", [(key,) for key in keys])
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM result_pages WHERE expires_at > ?", (time.time(),)).fetchone()[0]
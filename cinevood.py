@@ -1,167 +1,113 @@
-import cloudscraper
-from bs4 import BeautifulSoup
-import time
-import os
 import re
-from config import SITE_CONFIG, logger
-
-def get_movie_titles_and_links(movie_name=None, max_pages=5):
-    all_titles = []
-    movie_links = []
-    movie_count = 0
-    scraper = cloudscraper.create_scraper()
-
-    if movie_name:
-        search_query = f"{movie_name.replace(' ', '+').lower()}"
-        base_url = f"https://{SITE_CONFIG['cinevood']}/?s={search_query}"
-    else:
-        base_url = f"https://{SITE_CONFIG['cinevood']}/"
-
-    for page in range(1, max_pages + 1):
-        url = base_url if page == 1 else f"{base_url}page/{page}/"
-        logger.debug(f"Fetching page {page}: {url}")
-
-        try:
-            response = scraper.get(url, timeout=10)
-            response.raise_for_status()
-            logger.debug(f"Status code: {response.status_code}")
-
-            soup = BeautifulSoup(response.text, 'html.parser')
-            movie_elements = soup.select('article.latestPost.excerpt')
-            logger.debug(f"Found {len(movie_elements)} movie elements")
-
-            if not movie_elements:
-                logger.warning("No movie elements found on this page.")
-                with open(f"debug_page_{page}.html", "w", encoding="utf-8") as f:
-                    f.write(response.text)
-                if movie_name:
-                    break
-                continue
-
-            for element in movie_elements:
-                title_tag = element.select_one('h2.title.front-view-title a')
-                if title_tag:
-                    title = title_tag.text.strip()
-                    link = title_tag['href']
-                    if title and not any(exclude in title.lower() for exclude in ['©', 'all rights reserved']):
-                        movie_count += 1
-                        all_titles.append(f"{movie_count}. {title}")
-                        movie_links.append(link)
-
-            if movie_name:
-                pagination = soup.find('div', class_='pagination')
-                next_page = pagination.find('a', class_='next') if pagination else None
-                if not next_page:
-                    break
-
-            time.sleep(3)
-
-        except Exception as e:
-            logger.error(f"Error fetching page {page}: {e}")
+from config import logger
+import debug_capture
+import parsing
+from metrics import METRICS
+from models import ScrapeResult
+
+# Cinevood's listings are scraped from site_definitions.json by engine.Site; its
+# movie pages mix several layouts, so download links are extracted here instead
+# (the definition names this module's extract_download_links, which engine.Site calls
+# with the definition's key)
+
+# Precompiled matchers for the movie page layouts
+MAXBUTTON_RE = re.compile(r'maxbutton-\d+')
+SECTION_EXCLUDES = ('download', 'trailer')
+HEADING_EXCLUDES = ('download', 'trailer', 'watch online')
+
+def _is_maxbutton(tag):
+    return tag.name == 'a' and any(MAXBUTTON_RE.search(cls) for cls in tag.get('class') or ())
+
+def _button_text(tag):
+    span = tag.find('span', class_='mb-text')
+    return span.text.strip() if span else 'Download'
+
+def _index_movie_page(soup):
+    """Collect everything the layout strategies look at in one walk over the tree."""
+    sections, headings, center_headings, buttons = [], [], [], []
+    for tag in soup.find_all(True):
+        if tag.name == 'div' and 'download-btns' in (tag.get('class') or ()):
+            sections.append(tag)
+        elif tag.name == 'h6':
+            headings.append(tag)
+            if tag.find_parent('center'):
+                center_headings.append(tag)
+        elif _is_maxbutton(tag):
+            buttons.append(tag)
+    return sections, headings, center_headings, buttons
+
+def _buttons_after(heading, loose_buttons):
+    """Maxbuttons in the <p> siblings after a heading (and bare ones if loose_buttons), up to the next h6."""
+    for sibling in heading.next_siblings:
+        name = getattr(sibling, 'name', None)
+        if name == 'h6':
             break
-
-    return all_titles, movie_links
-
-def get_download_links(movie_url):
-    scraper = cloudscraper.create_scraper()
-    download_links = []
-    
-    try:
-        logger.debug(f"Fetching movie page: {movie_url}")
-        response = scraper.get(movie_url, timeout=10)
-        response.raise_for_status()
-        logger.debug(f"Status code: {response.status_code}")
-
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        # Try primary selector: div.download-btns
-        count = 0
-        for section in soup.find_all('div', class_='download-btns'):
-            description_tag = section.find('h6')
-            link_tags = section.find_all('a', href=True)
-            if description_tag and link_tags:
-                description = description_tag.text.strip()
-                if any(exclude in description.lower() for exclude in ['download', 'trailer']):
-                    continue
-                for link_tag in link_tags:
-                    count += 1
-                    link_text = link_tag.text.strip()
-                    link_url = link_tag['href']
-                    download_links.append(f"{count}) **{description} [{link_text}]** : {link_url}\n")
-
-        # Try new structure: center > h6 + p > a.maxbutton-*
-        if not download_links:
-            center_tags = soup.find_all('center')
-            for center_tag in center_tags:
-                h6_tags = center_tag.find_all('h6')
-                for h6_tag in h6_tags:
-                    description = h6_tag.text.strip()
-                    if any(exclude in description.lower() for exclude in ['download', 'trailer', 'watch online']):
-                        continue
-                    current = h6_tag.next_sibling
-                    while current:
-                        if current and hasattr(current, 'name') and current.name == 'p':
-                            link_tags = current.find_all('a', class_=re.compile(r'maxbutton-\d+'))
-                            for tag in link_tags:
-                                count += 1
-                                link_text = tag.find('span', class_='mb-text').text.strip() if tag.find('span', class_='mb-text') else 'Download'
-                                link_url = tag['href']
-                                download_links.append(f"{count}.) **{description} [{link_text}]** : {link_url}\n")
-                        elif current and hasattr(current, 'name') and current.name == 'h6':
-                            break
-                        current = current.next_sibling
-
-        # Fallback: search for h6 tags globally
-        if not download_links:
-            h6_tags = soup.find_all('h6')
-            for h6_tag in h6_tags:
-                description = h6_tag.text.strip()
-                if any(exclude in description.lower() for exclude in ['download', 'trailer', 'watch online']):
-                    continue
-                current = h6_tag.next_sibling
-                while current:
-                    if current and hasattr(current, 'name') and current.name == 'p':
-                        link_tags = current.find_all('a', class_=re.compile(r'maxbutton-\d+'))
-                        for tag in link_tags:
-                            count += 1
-                            link_text = tag.find('span', class_='mb-text').text.strip() if tag.find('span', class_='mb-text') else 'Download'
-                            link_url = tag['href']
-                            download_links.append(f"{count}.) **{description} [{link_text}]** : {link_url}\n")
-                    elif current and hasattr(current, 'name') and current.name == 'a' and re.search(r'maxbutton-\d+', ' '.join(current.get('class', []))):
-                        count += 1
-                        link_text = current.find('span', class_='mb-text').text.strip() if current.find('span', class_='mb-text') else 'Download'
-                        link_url = current['href']
-                        download_links.append(f"{count}.) **{description} [{link_text}]** : {link_url}\n")
-                    elif current and hasattr(current, 'name') and current.name == 'h6':
-                        break
-                    current = current.next_sibling
-
-        # Additional fallback: search for any <a> tags with maxbutton-* classes
-        if not download_links:
-            link_tags = soup.find_all('a', class_=re.compile(r'maxbutton-\d+'))
+        if name == 'p':
+            yield from sibling.find_all('a', class_=MAXBUTTON_RE)
+        elif loose_buttons and name == 'a' and _is_maxbutton(sibling):
+            yield sibling
+
+def _download_btns(index):
+    # div.download-btns: an h6 label followed by plain links
+    for section in index[0]:
+        description_tag = section.find('h6')
+        link_tags = section.find_all('a', href=True)
+        if description_tag and link_tags:
+            description = description_tag.text.strip()
+            if any(exclude in description.lower() for exclude in SECTION_EXCLUDES):
+                continue
             for link_tag in link_tags:
-                description = "Unknown Quality"
-                current = link_tag
-                while current:
-                    current = current.find_previous_sibling()
-                    if current and hasattr(current, 'name') and current.name == 'h6':
-                        description = current.text.strip()
-                        break
-                if any(exclude in description.lower() for exclude in ['download', 'trailer', 'watch online']):
-                    continue
-                count += 1
-                link_text = link_tag.find('span', class_='mb-text').text.strip() if link_tag.find('span', class_='mb-text') else 'Download'
-                link_url = link_tag['href']
-                download_links.append(f"{count}.) **{description} [{link_text}]** : {link_url}\n")
-
-        if not download_links:
-            logger.warning("No download links found.")
-            with open("debug_movie_page.html", "w", encoding="utf-8") as f:
-                f.write(response.text)
-            logger.info("Saved movie page HTML to debug_movie_page.html for inspection")
-
-        return download_links
-
-    except Exception as e:
-        logger.error(f"Error fetching page: {e}")
-        return []
\ No newline at end of file
+                yield description, link_tag.text.strip(), link_tag['href']
+
+def _headings(headings, loose_buttons):
+    for heading in headings:
+        description = heading.text.strip()
+        if any(exclude in description.lower() for exclude in HEADING_EXCLUDES):
+            continue
+        for tag in _buttons_after(heading, loose_buttons):
+            yield description, _button_text(tag), tag['href']
+
+def _center_headings(index):
+    # center > h6 + p > a.maxbutton-*
+    return _headings(index[2], loose_buttons=False)
+
+def _all_headings(index):
+    # h6 + p > a.maxbutton-* or h6 + a.maxbutton-* anywhere in the post
+    return _headings(index[1], loose_buttons=True)
+
+def _loose_buttons(index):
+    # Any maxbutton, labelled by the nearest h6 before it
+    for tag in index[3]:
+        heading = tag.find_previous_sibling('h6')
+        description = heading.text.strip() if heading else "Unknown Quality"
+        if any(exclude in description.lower() for exclude in HEADING_EXCLUDES):
+            continue
+        yield description, _button_text(tag), tag['href']
+
+# Layouts from newest to oldest; the first one that yields links wins
+EXTRACTION_STRATEGIES = (
+    ('download_btns', _download_btns),
+    ('center_h6', _center_headings),
+    ('h6_siblings', _all_headings),
+    ('maxbutton_scan', _loose_buttons),
+)
+
+def extract_download_links(response, site_key):
+    # Download sections can sit anywhere in the post, so the whole page is parsed
+    soup = parsing.parse(response.text)
+    index = _index_movie_page(soup)
+
+    for name, strategy in EXTRACTION_STRATEGIES:
+        download_links = [
+            ScrapeResult(f"{description} [{link_text}]", link_url, site_key, count)
+            for count, (description, link_text, link_url) in enumerate(strategy(index), 1)
+        ]
+        if download_links:
+            logger.debug("Download links matched by %s layout", name)
+            METRICS.inc('extraction_strategy_total', site=site_key, strategy=name)
+            return download_links
+
+    logger.warning("No download links found on this %s page.", site_key)
+    METRICS.inc('extraction_strategy_total', site=site_key, strategy='none')
+    debug_capture.capture(site_key, 'movie_page', response)
+    return []
@@ -0,0 +1,69 @@
+import threading
+import time
+import requests
+from config import CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT, logger
+
+class CircuitOpenError(requests.ConnectionError):
+    """Raised instead of sending a request to a domain whose circuit is open."""
+
+class CircuitBreaker:
+    """Fail fast on a domain after `failure_threshold` consecutive failures.
+
+    Once open, requests are refused for `reset_timeout` seconds; then a
+    single trial request is let through and its outcome closes the circuit
+    or opens it again.
+    """
+
+    def __init__(self, domain, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_TIMEOUT):
+        self.domain = domain
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_started = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        with self._lock:
+            return self.opened_at is not None
+
+    def before_request(self):
+        """Raise CircuitOpenError unless a request may go out now."""
+        with self._lock:
+            if self.opened_at is None:
+                return
+            now = time.monotonic()
+            if now - self.opened_at < self.reset_timeout:
+                raise CircuitOpenError(f"Circuit open for {self.domain}")
+            # A trial that never reported back (e.g. cancelled) does not block the next one
+            if self._trial_started is not None and now - self._trial_started < self.reset_timeout:
+                raise CircuitOpenError(f"Circuit open for {self.domain}")
+            self._trial_started = now
+
+    def record(self, ok):
+        """Report the outcome of a request (or health probe) to the domain."""
+        with self._lock:
+            self._trial_started = None
+            if ok:
+                if self.opened_at is not None:
+                    logger.info("Circuit closed for %s", self.domain)
+                self.failures = 0
+                self.opened_at = None
+                return
+            self.failures += 1
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.warning("Circuit opened for %s after %s failures", self.domain, self.failures)
+                self.opened_at = time.monotonic()
+
+_BREAKERS = {}
+_BREAKERS_LOCK = threading.Lock()
+
+def breaker(domain):
+    """Return the circuit breaker for a domain."""
+    with _BREAKERS_LOCK:
+        circuit = _BREAKERS.get(domain)
+        if circuit is None:
+            circuit = _BREAKERS[domain] = CircuitBreaker(domain)
+        return circuit
@@ -1,38 +1,174 @@
+import atexit
 import os
 import json
 import logging
-from datetime import datetime
+import queue
 import re
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# Initialize logging: callers only enqueue records, a listener thread does the I/O
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_DIR = os.environ.get('LOG_DIR', 'logs')
+LOG_MAX_BYTES = int(os.environ.get('LOG_MAX_BYTES', 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.environ.get('LOG_BACKUP_COUNT', 5))
+# Per-request timing spans go to the "spans" logger at INFO, so they follow LOG_LEVEL;
+# LOG_SPANS=0 silences them even when LOG_LEVEL lets INFO through
+LOG_SPANS = os.environ.get('LOG_SPANS', '1') == '1'
+
+# Worker processes behind one webhook receiver (1 runs the whole bot in this process),
+# and which worker this process is; set by workers.py for the processes it starts
+WORKERS = int(os.environ.get('WORKERS', 1))
+WORKER_INDEX = os.environ.get('WORKER_INDEX')
+
+os.makedirs(LOG_DIR, exist_ok=True)
+_log_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+_log_handlers = [
+    # Each worker process rotates its own file; rotation is not safe across processes
+    RotatingFileHandler(os.path.join(LOG_DIR, f'bot-worker{WORKER_INDEX}.log' if WORKER_INDEX else 'bot.log'), maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8'),
+    logging.StreamHandler(),
+]
+for _handler in _log_handlers:
+    _handler.setFormatter(_log_formatter)
+
+LOG_QUEUE = queue.SimpleQueue()
+LOG_LISTENER = QueueListener(LOG_QUEUE, *_log_handlers, respect_handler_level=True)
+_queue_handler = QueueHandler(LOG_QUEUE)
+# The message (and any traceback) is rendered once here; the listener's handlers add the prefix
+_queue_handler.setFormatter(logging.Formatter('%(message)s'))
+logging.basicConfig(level=LOG_LEVEL, handlers=[_queue_handler])
+if not LOG_SPANS:
+    logging.getLogger('spans').setLevel(logging.WARNING)
+LOG_LISTENER.start()
+atexit.register(LOG_LISTENER.stop)
 
-# Initialize logging
-log_dir = "logs"
-if not os.path.exists(log_dir):
-    os.makedirs(log_dir)
-
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(os.path.join(log_dir, f"bot_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log")),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
 # Configuration
 ALLOWED_IDS = {5809601894, 1285451259}
 TELEGRAM_BOT_TOKEN = os.environ.get('TELEGRAM_BOT_TOKEN')
 
+# Conversation sessions: "memory" (this process) or "sqlite" (a file every bot
+# process on the host shares), the SQLite file, and seconds a session lasts
+SESSION_STORE = os.environ.get('SESSION_STORE', 'sqlite' if WORKERS > 1 else 'memory')
+SESSION_STORE_PATH = os.environ.get('SESSION_STORE_PATH', 'sessions.db')
+SESSION_TIMEOUT = int(os.environ.get('SESSION_TIMEOUT', 1800))
+
+# Scrape result cache (seconds / number of result sets)
+RESULT_CACHE_TTL = int(os.environ.get('RESULT_CACHE_TTL', 600))
+RESULT_CACHE_SIZE = int(os.environ.get('RESULT_CACHE_SIZE', 256))
+# SQLite file the result cache lives in so worker processes share it ("" keeps it in this process)
+RESULT_CACHE_PATH = os.environ.get('RESULT_CACHE_PATH', 'result_cache.db' if WORKERS > 1 else '')
+
+# Persistent download-link cache: file, freshness and how long stale
+# entries are kept around for ETag/Last-Modified revalidation (seconds)
+LINK_CACHE_PATH = os.environ.get('LINK_CACHE_PATH', 'link_cache.db')
+LINK_CACHE_TTL = int(os.environ.get('LINK_CACHE_TTL', 6 * 3600))
+LINK_CACHE_MAX_AGE = int(os.environ.get('LINK_CACHE_MAX_AGE', 7 * 24 * 3600))
+
+# Local full-text index of scraped titles: file, how long unseen titles are kept
+# (seconds) and how much of a query a title must cover to match (0-1)
+TITLE_INDEX_PATH = os.environ.get('TITLE_INDEX_PATH', 'title_index.db')
+TITLE_INDEX_MAX_AGE = int(os.environ.get('TITLE_INDEX_MAX_AGE', 30 * 24 * 3600))
+TITLE_INDEX_MIN_SCORE = float(os.environ.get('TITLE_INDEX_MIN_SCORE', 0.5))
+
+# Opt-in: show a single-site search's title index matches at once, then replace them
+# with the site's own results when its live search finishes
+TITLE_INDEX_SEARCH = os.environ.get('TITLE_INDEX_SEARCH', '0') == '1'
+
+# Background crawl of every site's latest listing (which also feeds the title index): seconds
+# between crawls (0 disables) and pages read when a site has no snapshot yet; later crawls
+# stop at the first page with a title already in the snapshot
+LATEST_CRAWL_INTERVAL = int(os.environ.get('LATEST_CRAWL_INTERVAL', 900))
+LATEST_CRAWL_PAGES = int(os.environ.get('LATEST_CRAWL_PAGES', 3))
+
+# Latest-listing snapshots and subscriptions: SQLite file, titles kept per site, and the
+# age (seconds) past which /latest_movies scrapes the site live instead
+LATEST_SNAPSHOT_PATH = os.environ.get('LATEST_SNAPSHOT_PATH', 'latest.db')
+LATEST_SNAPSHOT_SIZE = int(os.environ.get('LATEST_SNAPSHOT_SIZE', 100))
+LATEST_SNAPSHOT_MAX_AGE = int(os.environ.get('LATEST_SNAPSHOT_MAX_AGE', 3 * LATEST_CRAWL_INTERVAL))
+
+# Seconds a crawled URL is remembered as already announced, so a featured post that
+# rotates back onto the front page within that time is not announced again
+LATEST_SEEN_MAX_AGE = int(os.environ.get('LATEST_SEEN_MAX_AGE', 30 * 24 * 3600))
+
+# Opt-in background warming of download links for the titles on screen
+PREFETCH_DOWNLOAD_LINKS = os.environ.get('PREFETCH_DOWNLOAD_LINKS', '0') == '1'
+PREFETCH_WORKERS = int(os.environ.get('PREFETCH_WORKERS', 2))
+
+# Threads shared by all concurrent page fetches
+FETCH_WORKERS = int(os.environ.get('FETCH_WORKERS', 8))
+
+# Seconds an "All Sites" search waits for each site before giving up on it
+ALL_SITES_DEADLINE = int(os.environ.get('ALL_SITES_DEADLINE', 25))
+
+# /status probe timeout (seconds) and request timings kept per domain for its p50/p95
+HEALTH_PROBE_TIMEOUT = int(os.environ.get('HEALTH_PROBE_TIMEOUT', 5))
+LATENCY_HISTORY_SIZE = int(os.environ.get('LATENCY_HISTORY_SIZE', 200))
+
+# Seconds between background probes of every site mirror
+HEALTH_CHECK_INTERVAL = int(os.environ.get('HEALTH_CHECK_INTERVAL', 300))
+
+# Consecutive failures that open a domain's circuit, and seconds before it is retried
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', 3))
+CIRCUIT_RESET_TIMEOUT = int(os.environ.get('CIRCUIT_RESET_TIMEOUT', 60))
+
+# Snapshots of pages a scraper found nothing on: directory, total size cap (0 disables), gzip
+DEBUG_CAPTURE_DIR = os.environ.get('DEBUG_CAPTURE_DIR', 'debug_captures')
+DEBUG_CAPTURE_MAX_BYTES = int(os.environ.get('DEBUG_CAPTURE_MAX_BYTES', 20 * 1024 * 1024))
+DEBUG_CAPTURE_COMPRESS = os.environ.get('DEBUG_CAPTURE_COMPRESS', '1') == '1'
+
+# Port for a Prometheus text endpoint at /metrics (0 disables it)
+METRICS_PORT = int(os.environ.get('METRICS_PORT', 0))
+
+# Updates queued per worker before the webhook receiver asks Telegram to retry later
+WORKER_QUEUE_SIZE = int(os.environ.get('WORKER_QUEUE_SIZE', 500))
+
+# "threaded" scrapes inside the handler threads; "async" hands scrapes to an asyncio event loop
+BOT_RUNTIME = os.environ.get('BOT_RUNTIME', 'threaded')
+
+# Per-site scraping rules (URL templates, selectors, pagination, download-link steps);
+# adding a site is a new entry here, see engine.py
+SITE_DEFINITIONS_FILE = os.environ.get('SITE_DEFINITIONS_FILE', 'site_definitions.json')
+
+def load_site_definitions():
+    """Read the site definitions; the bot cannot scrape anything without them."""
+    try:
+        with open(SITE_DEFINITIONS_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        logger.error(f"Error loading site definitions from {SITE_DEFINITIONS_FILE}: {e}")
+        raise
+
+SITE_DEFINITIONS = load_site_definitions()
+
 # Site domains (default values)
-SITE_CONFIG = {
-    'hdmovie2': 'hdmovie2.trading',
-    'hdhub4u': 'hdhub4u.gratis',
-    'cinevood': '1cinevood.asia'
+SITE_CONFIG = {key: definition['domain'] for key, definition in SITE_DEFINITIONS.items()}
+
+# Request budget per site: sustained requests per second and burst size
+SITE_RATE_LIMITS = {
+    key: {'rate': 0.5, 'burst': 6, **definition.get('rate_limit', {})}
+    for key, definition in SITE_DEFINITIONS.items()
 }
+# SQLite file holding the budgets so worker processes draw on the same ones ("" keeps them in this process)
+RATE_LIMIT_PATH = os.environ.get('RATE_LIMIT_PATH', 'rate_limits.db' if WORKERS > 1 else '')
+
+# Candidate domains per site; the health monitor routes to the fastest healthy one
+SITE_MIRRORS = {key: [domain] for key, domain in SITE_CONFIG.items()}
 
 # File to store updated domains
 CONFIG_FILE = 'site_config.json'
 
+# Callbacks run as fn(site_key, new_domain) after a domain update
+DOMAIN_CHANGE_LISTENERS = []
+
+# (inode, mtime) of CONFIG_FILE as last read or written by this process; every save
+# swaps in a new file, so the inode changes even within one mtime tick
+_config_stamp = None
+
+def _stat_config():
+    stat = os.stat(CONFIG_FILE)
+    return stat.st_ino, stat.st_mtime_ns
+
 def validate_domain(domain, site_key):
     """Accept any domain string for the given site without strict validation."""
     
@@ -40,19 +176,29 @@ def validate_domain(domain, site_key):
         logger.warning(f"Empty domain provided for {site_key}")
         return False
     
-    logger.debug(f"Domain '{domain}' accepted for {site_key}")
+    logger.debug("Domain '%s' accepted for %s", domain, site_key)
     return True
 
 def load_site_config():
     """Load site domains from file or use defaults."""
-    global SITE_CONFIG
+    global SITE_CONFIG, _config_stamp
     try:
         if os.path.exists(CONFIG_FILE):
+            _config_stamp = _stat_config()
             with open(CONFIG_FILE, 'r') as f:
                 loaded_config = json.load(f)
                 for key in SITE_CONFIG.keys():
                     if key in loaded_config and validate_domain(loaded_config[key], key):
                         SITE_CONFIG[key] = loaded_config[key]
+                for key, mirrors in loaded_config.get('mirrors', {}).items():
+                    if key in SITE_MIRRORS:
+                        SITE_MIRRORS[key] = [domain for domain in mirrors if validate_domain(domain, key)]
+                for key, domain in SITE_CONFIG.items():
+                    if domain not in SITE_MIRRORS[key]:
+                        SITE_MIRRORS[key].insert(0, domain)
+                for key, limits in loaded_config.get('rate_limits', {}).items():
+                    if key in SITE_RATE_LIMITS:
+                        SITE_RATE_LIMITS[key].update(limits)
                 logger.info("Loaded site config from file")
         else:
             logger.info("No site_config.json found, using default SITE_CONFIG")
@@ -61,14 +207,48 @@ def load_site_config():
         save_site_config()
 
 def save_site_config():
-    """Save site domains to file."""
+    """Save site domains, mirrors and rate limits to file."""
+    global _config_stamp
     try:
-        with open(CONFIG_FILE, 'w') as f:
-            json.dump(SITE_CONFIG, f, indent=2)
+        # Write a temporary file and swap it in, so other processes never read half a file
+        temp_file = f"{CONFIG_FILE}.{os.getpid()}.tmp"
+        with open(temp_file, 'w') as f:
+            json.dump({**SITE_CONFIG, 'mirrors': SITE_MIRRORS, 'rate_limits': SITE_RATE_LIMITS}, f, indent=2)
+        os.replace(temp_file, CONFIG_FILE)
+        _config_stamp = _stat_config()
         logger.info("Saved site config to file")
     except Exception as e:
         logger.error(f"Error saving site config: {e}")
 
+def register_domain_listener(callback):
+    """Register a callback to run whenever a site's domain changes."""
+    DOMAIN_CHANGE_LISTENERS.append(callback)
+
+def _notify_domain_change(site_key, new_domain):
+    for callback in DOMAIN_CHANGE_LISTENERS:
+        try:
+            callback(site_key, new_domain)
+        except Exception as e:
+            logger.error(f"Error in domain change listener for {site_key}: {e}")
+
+def reload_site_config():
+    """Pick up a site config another process saved, running the domain listeners for each moved site.
+
+    Costs one stat() while the file is unchanged, so it can run before every update.
+    """
+    try:
+        stamp = _stat_config()
+    except OSError:
+        return
+    if stamp == _config_stamp:
+        return
+    previous = dict(SITE_CONFIG)
+    load_site_config()
+    for site_key, domain in SITE_CONFIG.items():
+        if domain != previous[site_key]:
+            logger.info(f"Reloaded {site_key} domain: {domain}")
+            _notify_domain_change(site_key, domain)
+
 def update_site_domain(site_key, new_domain):
     """Update a site's domain and save to file."""
     if site_key not in SITE_CONFIG:
@@ -81,9 +261,14 @@ def update_site_domain(site_key, new_domain):
         logger.warning(f"Invalid domain for {site_key}: {cleaned_domain}")
         return False
 
+    # Start from what other workers saved, so this write does not undo their updates
+    reload_site_config()
     SITE_CONFIG[site_key] = cleaned_domain
+    if cleaned_domain not in SITE_MIRRORS[site_key]:
+        SITE_MIRRORS[site_key].append(cleaned_domain)
     save_site_config()
     logger.info(f"Updated {site_key} domain to {cleaned_domain}")
+    _notify_domain_change(site_key, cleaned_domain)
     return True
 
 load_site_config()
@@ -0,0 +1,106 @@
+import atexit
+import gzip
+import hashlib
+import os
+import queue
+import threading
+import time
+from collections import deque
+from config import DEBUG_CAPTURE_DIR, DEBUG_CAPTURE_MAX_BYTES, DEBUG_CAPTURE_COMPRESS, logger
+
+class DebugCapture:
+    """Saves snapshots of pages a scraper could not read, off the request path.
+
+    capture() only queues the snapshot, dropping it if the queue is full, so
+    a reply never waits on the disk. A background thread writes one file per
+    snapshot and deletes the oldest ones once the directory holds more than
+    max_bytes.
+    """
+
+    def __init__(self, directory, max_bytes, compress=True, queue_size=32):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._files = deque()
+        self._total = 0
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def capture(self, site_key, kind, response):
+        """Queue response's body for writing; kind says which page it was (e.g. movie_page)."""
+        if self.max_bytes <= 0:
+            return
+        self._start()
+        try:
+            self._queue.put_nowait((time.time(), site_key, kind, response.url, response.content))
+        except queue.Full:
+            logger.debug("Debug capture queue full, dropped %s from %s", kind, site_key)
+
+    def flush(self):
+        """Block until every queued snapshot is on disk."""
+        if self._thread is not None:
+            self._queue.join()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='debug-capture', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        self._load()
+        while True:
+            item = self._queue.get()
+            try:
+                self._write(*item)
+            except OSError as e:
+                logger.error("Error writing debug capture: %s", e)
+            finally:
+                self._queue.task_done()
+
+    def _load(self):
+        """Pick up captures left by earlier runs so they count towards the size cap."""
+        os.makedirs(self.directory, exist_ok=True)
+        for name in sorted(os.listdir(self.directory)):
+            path = os.path.join(self.directory, name)
+            if os.path.isfile(path):
+                size = os.path.getsize(path)
+                self._files.append((path, size))
+                self._total += size
+        self._trim()
+
+    def _write(self, timestamp, site_key, kind, url, content):
+        # Timestamp first so names sort oldest to newest; the URL is kept in a comment
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(timestamp)) + f"{timestamp % 1:.3f}"[1:]
+        digest = hashlib.sha1(url.encode()).hexdigest()[:10]
+        name = f"{stamp}_{site_key}_{kind}_{digest}.html" + ('.gz' if self.compress else '')
+        data = f"<!-- {url} -->\n".encode() + content
+        if self.compress:
+            data = gzip.compress(data)
+
+        path = os.path.join(self.directory, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        self._files.append((path, len(data)))
+        self._total += len(data)
+        logger.debug("Saved debug capture %s for %s", name, url)
+        self._trim()
+
+    def _trim(self):
+        while self._total > self.max_bytes and self._files:
+            path, size = self._files.popleft()
+            self._total -= size
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+DEBUG_CAPTURE = DebugCapture(DEBUG_CAPTURE_DIR, DEBUG_CAPTURE_MAX_BYTES, DEBUG_CAPTURE_COMPRESS)
+
+# The writer is a daemon thread; write out what is still queued before the process exits
+atexit.register(DEBUG_CAPTURE.flush)
+
+def capture(site_key, kind, response):
+    """Save a snapshot of response in the background; see DebugCapture."""
+    DEBUG_CAPTURE.capture(site_key, kind, response)
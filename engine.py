@@ -0,0 +1,210 @@
+import functools
+import importlib
+import itertools
+from config import SITE_CONFIG, SITE_DEFINITIONS, logger
+import aio_http
+import async_runtime
+import debug_capture
+import http_client
+import link_cache
+import parsing
+import title_index
+from metrics import METRICS
+from models import ScrapeResult
+
+class Site:
+    """A scraper driven by one entry of site_definitions.json.
+
+    "latest" and "search" describe a listing crawl: page URL templates,
+    the containers kept while parsing, the item/title/link selectors of
+    each result section and the selector that marks a next page. "links"
+    lists the steps from a movie page to its download links; a step either
+    selects the links, follows one link to another page, or names a
+    "module:function" extractor for layouts selectors cannot describe.
+    A mode or step may set "stream_until" to containers after which the
+    page's download stops early.
+    """
+
+    def __init__(self, key, definition):
+        self.key = key
+        self.name = definition['name']
+        self.definition = definition
+        self.exclude_titles = tuple(definition.get('exclude_titles', ()))
+        self.link_steps = definition['links']
+
+    def _excluded(self, text, excludes):
+        text = text.lower()
+        return any(exclude in text for exclude in excludes)
+
+    def _listing(self, movie_name, pages, known=None):
+        """Plan a crawl of the listing pages numbered in pages: (page urls, fetch window, page parser, result getter).
+
+        With known (a set of URLs), the crawl stops after the first page that
+        lists one of them outside the first-page-only sections, and reads
+        pages one at a time so no page past that one is requested.
+        """
+        mode = self.definition['search' if movie_name else 'latest']
+        query = movie_name.replace(' ', '+').lower() if movie_name else ''
+        domain = SITE_CONFIG[self.key]
+        page_urls = (
+            mode['first_page'].format(domain=domain, query=query) if page == 1
+            else mode['page'].format(domain=domain, query=query, page=page)
+            for page in pages
+        )
+        # Listing pages are independent; search pages are usually fetched one page ahead
+        window = 1 if known else mode.get('window') or http_client.MAX_CONCURRENT_PAGES
+        sections = mode['sections']
+        found = [[] for _ in sections]
+
+        def parse_page(page, response):
+            active = [
+                (section, results) for section, results in zip(sections, found)
+                if page == 1 or not section.get('first_page_only')
+            ]
+            containers = tuple(mode.get('containers', ())) + tuple(
+                container for section, _ in active for container in section['containers']
+            )
+            soup = parsing.parse(response.text, containers)
+
+            items_found = 0
+            reached_known = False
+            for section, results in active:
+                items = soup.select(section['items'])
+                logger.debug("Found %s movie elements with '%s' selector.", len(items), section['items'])
+                items_found += len(items)
+                if not items:
+                    logger.warning("No movie elements found on this %s page.", self.name)
+                    debug_capture.capture(self.key, section.get('capture', f"page_{page}"), response)
+
+                for item in items:
+                    title_tag = item.select_one(section['title'])
+                    link_tag = item.select_one(section['link']) if 'link' in section else title_tag
+                    if title_tag and link_tag and link_tag.get('href'):
+                        title = title_tag.text.strip()
+                        if title and not self._excluded(title, self.exclude_titles):
+                            results.append((title, link_tag['href']))
+                        # Featured blocks are not in date order, so only the listing proper counts
+                        if known and not section.get('first_page_only') and link_tag['href'] in known:
+                            reached_known = True
+
+            if reached_known:
+                logger.debug("Reached a known title on page %s.", page)
+                return False
+            if not items_found:
+                return not mode.get('stop_on_empty')
+            if mode.get('next_page') and soup.select_one(mode['next_page']) is None:
+                logger.debug("No next page found.")
+                return False
+            return True
+
+        def collect():
+            titles = itertools.chain.from_iterable(
+                results[:section['limit']] if 'limit' in section else results
+                for section, results in zip(sections, found)
+            )
+            return [ScrapeResult(title, link, self.key, rank) for rank, (title, link) in enumerate(titles, 1)]
+
+        return page_urls, window, parse_page, collect
+
+    def _stream_kwargs(self, movie_name):
+        stream_until = _stream_until(self.definition['search' if movie_name else 'latest'])
+        return {'stream_until': stream_until} if stream_until else {}
+
+    def get_movie_titles_and_links(self, movie_name=None, max_pages=5, known=None):
+        with METRICS.timer('scrape_seconds', site=self.key, op='titles'):
+            page_urls, window, parse_page, collect = self._listing(movie_name, range(1, max_pages + 1), known)
+            results = http_client.crawl(self.key, page_urls, parse_page, collect, window, **self._stream_kwargs(movie_name))
+        # Everything a listing shows feeds the local title search
+        title_index.TITLE_INDEX.add(results)
+        return results
+
+    def _single_page(self, movie_name, page):
+        page_urls, _, parse_page, collect = self._listing(movie_name, [page])
+        more = []
+
+        def parse_and_remember(page, response):
+            more.append(parse_page(page, response))
+            return more[-1]
+
+        return page_urls, parse_and_remember, collect, more
+
+    def get_listing_page(self, movie_name, page):
+        """Fetch page `page` of a listing alone: (its ScrapeResults, whether the site has a page after it)."""
+        with METRICS.timer('scrape_seconds', site=self.key, op='titles'):
+            page_urls, parse_page, collect, more = self._single_page(movie_name, page)
+            results = http_client.crawl(self.key, page_urls, parse_page, collect, 1, page, **self._stream_kwargs(movie_name))
+        title_index.TITLE_INDEX.add(results)
+        # A page that failed to load was never parsed; treat it as the end
+        return results, bool(more and more[-1])
+
+    async def aget_listing_page(self, movie_name, page):
+        with METRICS.timer('scrape_seconds', site=self.key, op='titles'):
+            page_urls, parse_page, collect, more = self._single_page(movie_name, page)
+            results = await aio_http.crawl(self.key, page_urls, parse_page, collect, 1, page, **self._stream_kwargs(movie_name))
+        await async_runtime.run_sync(title_index.TITLE_INDEX.add, results)
+        return results, bool(more and more[-1])
+
+    def get_download_links(self, movie_url):
+        with METRICS.timer('scrape_seconds', site=self.key, op='links'):
+            try:
+                return link_cache.fetch_links(self.key, movie_url, self.extract_download_links, _stream_until(self.link_steps[0]))
+
+            except Exception as e:
+                logger.error("Error fetching %s page: %s", self.name, e)
+                return []
+
+    async def aget_download_links(self, movie_url):
+        with METRICS.timer('scrape_seconds', site=self.key, op='links'):
+            try:
+                return await link_cache.afetch_links(self.key, movie_url, self.extract_download_links, _stream_until(self.link_steps[0]))
+
+            except Exception as e:
+                logger.error("Error fetching %s page: %s", self.name, e)
+                return []
+
+    def extract_download_links(self, response, step=0):
+        """Apply link step `step` to a fetched page: a link list, or a FollowLink to the next step."""
+        rule = self.link_steps[step]
+        if 'extractor' in rule:
+            # Called with the site's key, so one extractor can serve several definitions
+            return _extractor(rule['extractor'])(response, self.key)
+
+        soup = parsing.parse(response.text, rule.get('containers'))
+        capture_kind = rule.get('capture', 'movie_page')
+        if 'follow' in rule:
+            tag = soup.select_one(rule['follow'])
+            if tag is None:
+                logger.warning("No download page link found on this %s page.", self.name)
+                debug_capture.capture(self.key, capture_kind, response)
+                return []
+            # The links themselves sit on a separate page
+            return link_cache.FollowLink(
+                tag['href'], functools.partial(self.extract_download_links, step=step + 1), _stream_until(self.link_steps[step + 1])
+            )
+
+        excludes = tuple(rule.get('exclude', ()))
+        download_links = []
+        for tag in soup.select(rule['links']):
+            text_tag = tag.select_one(rule['text']) if 'text' in rule else None
+            link_text = (text_tag or tag).text.strip()
+            link_url = tag.get('href')
+            if link_text and link_url and not self._excluded(link_text, excludes):
+                download_links.append(ScrapeResult(link_text, link_url, self.key, len(download_links) + 1))
+
+        if not download_links:
+            logger.warning("No download links found on this %s page.", self.name)
+            debug_capture.capture(self.key, capture_kind, response)
+        return download_links
+
+def _stream_until(rule):
+    # A tuple, so requests for the same page with the same stop point can be coalesced
+    return tuple(rule['stream_until']) if rule.get('stream_until') else None
+
+@functools.lru_cache(maxsize=None)
+def _extractor(spec):
+    """Resolve a "module:function" extractor named in a site definition."""
+    module_name, _, function_name = spec.partition(':')
+    return getattr(importlib.import_module(module_name), function_name)
+
+# One scraper per defined site, in definition order
+SITES = {key: Site(key, definition) for key, definition in SITE_DEFINITIONS.items()}
@@ -0,0 +1,136 @@
+import socket
+import ssl
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+import http_client
+from circuit import breaker
+from config import SITE_CONFIG, SITE_MIRRORS, HEALTH_PROBE_TIMEOUT, logger, update_site_domain
+from latency import LATENCY_HISTORY
+from ratelimit import RATE_LIMITER
+
+# Most of a front page is irrelevant to a health check; stop reading after this much
+PROBE_READ_LIMIT = 256 * 1024
+
+# A healthy mirror must be this many times faster than the current domain to replace it
+MIRROR_SWITCH_RATIO = 2
+
+# Probes wait on the rate limiter in threads of their own, never in http_client.FETCH_EXECUTOR,
+# so a throttled site cannot hold up /status or users' page fetches
+PROBE_EXECUTOR = ThreadPoolExecutor(max_workers=6, thread_name_prefix='probe')
+
+_SSL_CONTEXT = ssl.create_default_context()
+
+class ProbeResult:
+    """Phase timings (seconds) of one GET / against a site; None for phases not reached."""
+    __slots__ = ('site', 'domain', 'status_code', 'server', 'dns', 'connect', 'tls', 'ttfb', 'total', 'error')
+
+    def __init__(self, site, domain):
+        self.site = site
+        self.domain = domain
+        self.status_code = None
+        self.server = ''
+        self.dns = self.connect = self.tls = self.ttfb = self.total = None
+        self.error = None
+
+    @property
+    def ok(self):
+        # Cloudflare answers a bare GET with a challenge; the site behind it is still up
+        if self.error is not None or self.status_code is None:
+            return False
+        return self.status_code < 500 or 'cloudflare' in self.server
+
+def probe(site_key, domain, timeout=HEALTH_PROBE_TIMEOUT):
+    """Fetch https://domain/ over a raw socket, timing DNS, connect, TLS and first byte.
+
+    The request is made by hand because requests does not expose its phase
+    timings; the result is also added to the domain's latency history.
+    """
+    result = ProbeResult(site_key, domain)
+    RATE_LIMITER.acquire(site_key, f"https://{domain}/")
+    started = time.perf_counter()
+    try:
+        address = socket.getaddrinfo(domain, 443, type=socket.SOCK_STREAM)[0][4][:2]
+        result.dns = time.perf_counter() - started
+
+        with socket.create_connection(address, timeout=timeout) as raw_sock:
+            result.connect = time.perf_counter() - started
+            with _SSL_CONTEXT.wrap_socket(raw_sock, server_hostname=domain) as sock:
+                result.tls = time.perf_counter() - started
+                request = (
+                    f"GET / HTTP/1.1\r\nHost: {domain}\r\n"
+                    f"User-Agent: {http_client.BROWSER_HEADERS['User-Agent']}\r\n"
+                    f"Accept: {http_client.BROWSER_HEADERS['Accept']}\r\nConnection: close\r\n\r\n"
+                )
+                sock.sendall(request.encode())
+                chunk = sock.recv(65536)
+                result.ttfb = time.perf_counter() - started
+                head = chunk.split(b'\r\n\r\n', 1)[0].decode('latin-1').split('\r\n')
+                result.status_code = int(head[0].split()[1])
+                for line in head[1:]:
+                    name, _, value = line.partition(':')
+                    if name.strip().lower() == 'server':
+                        result.server = value.strip().lower()
+
+                received = len(chunk)
+                while chunk and received < PROBE_READ_LIMIT:
+                    chunk = sock.recv(65536)
+                    received += len(chunk)
+        result.total = time.perf_counter() - started
+    except (OSError, ValueError, IndexError) as e:
+        result.error = str(e) or type(e).__name__
+        logger.warning(f"Health probe failed for {site_key} ({domain}): {result.error}")
+
+    LATENCY_HISTORY.record(domain, time.perf_counter() - started, result.ok)
+    breaker(domain).record(result.ok)
+    return result
+
+def _probe_many(targets, timeout):
+    """Probe (site_key, domain) pairs at once; returns ProbeResults in the same order."""
+    futures = [(site_key, domain, PROBE_EXECUTOR.submit(probe, site_key, domain, timeout)) for site_key, domain in targets]
+    # Each socket operation has its own timeout, so allow for all of them plus the rate limiter
+    wait([future for _, _, future in futures], timeout=timeout * 4)
+
+    results = []
+    for site_key, domain, future in futures:
+        if future.done():
+            results.append(future.result())
+        else:
+            future.cancel()
+            result = ProbeResult(site_key, domain)
+            result.error = "timed out"
+            results.append(result)
+    return results
+
+def probe_all(timeout=HEALTH_PROBE_TIMEOUT):
+    """Probe every configured site at once; returns ProbeResults in SITE_CONFIG order."""
+    return _probe_many(SITE_CONFIG.items(), timeout)
+
+def check_mirrors(timeout=HEALTH_PROBE_TIMEOUT):
+    """Probe every mirror of every site and move each site to its fastest healthy mirror.
+
+    A site only leaves its current domain when that domain is unhealthy or
+    a mirror answers MIRROR_SWITCH_RATIO times faster, so routing does not
+    flap between mirrors of similar speed. Returns {site_key: domain in use}.
+    """
+    targets = [
+        (site_key, domain)
+        for site_key, current in SITE_CONFIG.items()
+        for domain in dict.fromkeys([current] + SITE_MIRRORS.get(site_key, []))
+    ]
+    healthy = {}
+    for result in _probe_many(targets, timeout):
+        if result.ok:
+            healthy.setdefault(result.site, {})[result.domain] = result.total
+
+    for site_key, current in list(SITE_CONFIG.items()):
+        timings = healthy.get(site_key)
+        if not timings:
+            logger.warning(f"No healthy mirror for {site_key}; keeping {current}")
+            continue
+        best = min(timings, key=timings.get)
+        if best == current:
+            continue
+        if current not in timings or timings[best] * MIRROR_SWITCH_RATIO < timings[current]:
+            logger.warning(f"Routing {site_key} from {current} to mirror {best}")
+            update_site_domain(site_key, best)
+    return dict(SITE_CONFIG)
@@ -0,0 +1,389 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import urlparse
+import cloudscraper
+import requests
+from circuit import breaker
+from config import SITE_CONFIG, SITE_DEFINITIONS, FETCH_WORKERS, logger, register_domain_listener
+from latency import LATENCY_HISTORY
+from metrics import METRICS
+import parsing
+from ratelimit import RATE_LIMITER
+from spans import log_span
+
+BROWSER_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/117.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Connection': 'keep-alive'
+}
+
+# Sites served behind a Cloudflare challenge; the rest use a plain requests session
+CLOUDSCRAPER_SITES = {key for key, definition in SITE_DEFINITIONS.items() if definition.get('cloudflare')}
+
+# Bytes read per step when a body is streamed until its containers have closed
+STREAM_CHUNK_SIZE = 16 * 1024
+
+# After stopping early, a rest of the body up to this size is read and thrown away so
+# the keep-alive connection goes back to the pool; past it, a new connection is cheaper
+STREAM_DRAIN_LIMIT = 64 * 1024
+
+# Idle sessions kept per site once their request is done
+MAX_IDLE_SESSIONS = 4
+
+# URL prefix -> requests transport adapter mounted on every new session
+# (the offline benchmarks mount a replay adapter here)
+TRANSPORT_ADAPTERS = {}
+
+# Pages of a single listing fetched at the same time
+MAX_CONCURRENT_PAGES = 5
+
+FETCH_EXECUTOR = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix='fetch')
+
+class DelayedStarts:
+    """One thread that runs callbacks once their delay is up, earliest first.
+
+    Requests over their domain's rate budget wait here rather than in a
+    FETCH_EXECUTOR thread, so one throttled site cannot tie up the pool.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._order = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def call_later(self, delay, fn, *args):
+        with self._cond:
+            heapq.heappush(self._heap, (time.monotonic() + delay, next(self._order), fn, args))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='fetch-delayed', daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap or self._heap[0][0] > time.monotonic():
+                    self._cond.wait(self._heap[0][0] - time.monotonic() if self._heap else None)
+                _, _, fn, args = heapq.heappop(self._heap)
+            try:
+                fn(*args)
+            except Exception as e:
+                logger.error("Error starting delayed request: %s", e)
+
+DELAYED_STARTS = DelayedStarts()
+
+class SessionPool:
+    """Keep-alive sessions for one site that share solved Cloudflare cookies.
+
+    A session is leased to one thread at a time, since cloudscraper keeps
+    per-request challenge state on the session. Clearance cookies are only
+    valid together with the User-Agent they were issued for, so both are
+    copied into every new session.
+    """
+
+    def __init__(self, site_key, domain):
+        self.site_key = site_key
+        self.domain = domain
+        self.closed = False
+        self._idle = []
+        self._lock = threading.Lock()
+        self._cookies = requests.cookies.RequestsCookieJar()
+        self._user_agent = None
+
+    def _create_session(self):
+        if self.site_key in CLOUDSCRAPER_SITES:
+            session = cloudscraper.create_scraper()
+        else:
+            session = requests.Session()
+            session.headers.update(BROWSER_HEADERS)
+        for prefix, adapter in TRANSPORT_ADAPTERS.items():
+            session.mount(prefix, adapter)
+        with self._lock:
+            if self._user_agent:
+                session.headers['User-Agent'] = self._user_agent
+            self._cookies.clear_expired_cookies()
+            session.cookies.update(self._cookies)
+        logger.debug("Created new session for %s (%s)", self.site_key, self.domain)
+        return session
+
+    def acquire(self):
+        """Lease an idle session, creating one if none is free."""
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return self._create_session()
+
+    def release(self, session):
+        """Return a leased session and publish any cookies it picked up."""
+        session.cookies.clear_expired_cookies()
+        with self._lock:
+            if len(session.cookies):
+                self._cookies.update(session.cookies)
+                self._user_agent = session.headers.get('User-Agent')
+            if not self.closed and len(self._idle) < MAX_IDLE_SESSIONS:
+                self._idle.append(session)
+                return
+        session.close()
+
+    def idle_count(self):
+        """Sessions waiting in the pool to be leased."""
+        with self._lock:
+            return len(self._idle)
+
+    def clearance(self):
+        """Solved cookies and the User-Agent they belong to, for clients outside the pool."""
+        with self._lock:
+            self._cookies.clear_expired_cookies()
+            return {cookie.name: cookie.value for cookie in self._cookies}, self._user_agent
+
+    def close(self):
+        """Close idle sessions; leased ones are closed when released."""
+        with self._lock:
+            self.closed = True
+            idle, self._idle = self._idle, []
+        for session in idle:
+            session.close()
+
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+def get_pool(site_key):
+    """Return the session pool for a site, rebuilding it if its domain moved."""
+    domain = SITE_CONFIG[site_key]
+    with _POOLS_LOCK:
+        pool = _POOLS.get(site_key)
+        if pool is None or pool.domain != domain:
+            if pool is not None:
+                pool.close()
+            pool = SessionPool(site_key, domain)
+            _POOLS[site_key] = pool
+    return pool
+
+def reset_pool(site_key, new_domain=None):
+    """Drop a site's pooled sessions and cookies."""
+    with _POOLS_LOCK:
+        pool = _POOLS.pop(site_key, None)
+    if pool is not None:
+        pool.close()
+        logger.info("Reset session pool for %s", site_key)
+
+@contextmanager
+def session_for(site_key):
+    """Lease a pooled session for a site for the duration of the block."""
+    pool = get_pool(site_key)
+    session = pool.acquire()
+    try:
+        yield session
+    finally:
+        pool.release(session)
+
+_INFLIGHT = {}
+_INFLIGHT_LOCK = threading.Lock()
+
+def record_request(site_key, host, seconds, status, ok):
+    """Feed a finished request (status None if it failed) to the latency history, breaker and metrics."""
+    LATENCY_HISTORY.record(host, seconds, ok)
+    breaker(host).record(ok)
+    METRICS.observe('stage_seconds', seconds, site=site_key, stage='fetch')
+    METRICS.inc('http_requests_total', site=site_key, status=str(status) if status else 'error')
+
+def record_stream(site_key, url, read, content_length, stopped):
+    """Count a streamed body's bytes and, when it was cut short, the bytes it never downloaded.
+
+    read and content_length are wire bytes; without a Content-Length (chunked
+    replies) the saving is unknown and only the early stop is counted.
+    """
+    METRICS.inc('stream_bytes_read_total', read, site=site_key)
+    if not stopped:
+        return
+    METRICS.inc('stream_early_stops_total', site=site_key)
+    if content_length:
+        METRICS.inc('stream_bytes_saved_total', max(content_length - read, 0), site=site_key)
+    logger.debug("Stopped reading %s after %s of %s bytes", url, read, content_length or 'unknown')
+
+def _drain(raw, left, limit=STREAM_DRAIN_LIMIT):
+    """Read raw to its end unless more than limit bytes (or `left`, when known) remain; True if it ended."""
+    if left is not None and left > limit:
+        return False
+    drained = 0
+    while drained <= limit:
+        chunk = raw.read(STREAM_CHUNK_SIZE)
+        if not chunk:
+            return True
+        drained += len(chunk)
+    return False
+
+def _read_until(site_key, response, containers):
+    """Read a streamed 200 response only until every container has closed.
+
+    The bytes read become response.content, so callers use it as usual.
+    A short rest of the body is drained so the connection can be reused
+    (see STREAM_DRAIN_LIMIT); a long one is never downloaded.
+    """
+    if response.status_code != 200:
+        # Error pages and challenges are read whole, as without streaming
+        response.content
+        return response
+    content_length = response.headers.get('Content-Length')
+    content_length = int(content_length) if content_length and content_length.isdigit() else None
+    watcher = parsing.ContainerWatcher(containers)
+    chunks = []
+    stopped = False
+    try:
+        for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+            chunks.append(chunk)
+            if watcher.feed_bytes(chunk):
+                stopped = True
+                break
+        response._content = b''.join(chunks)
+        tell = getattr(response.raw, 'tell', None)
+        read = tell() if tell else len(response._content)
+        if stopped and _drain(response.raw, content_length - read if content_length else None):
+            logger.debug("Drained the rest of %s to keep its connection", response.url)
+            read = tell() if tell else read
+    finally:
+        # Releases a drained connection to the pool, or drops one with body left on it
+        response.close()
+    record_stream(site_key, response.url, read, content_length, stopped)
+    return response
+
+def _fetch(site_key, url, stream_until=None, reserved=False, **kwargs):
+    host = urlparse(url).hostname
+    breaker(host).before_request()
+    if not reserved:
+        RATE_LIMITER.acquire(site_key, url)
+    started = time.perf_counter()
+    status = None
+    try:
+        with session_for(site_key) as session:
+            if stream_until:
+                response = _read_until(site_key, session.get(url, stream=True, **kwargs), stream_until)
+            else:
+                response = session.get(url, **kwargs)
+        status = response.status_code
+        return response
+    finally:
+        record_request(site_key, host, time.perf_counter() - started, status, status is not None and status < 500)
+
+def get(site_key, url, reserved=False, **kwargs):
+    """GET a URL through the site's session pool within its rate limit.
+
+    Raises CircuitOpenError straight away while the domain's circuit is open.
+    reserved=True means the caller already took the request's rate-limit
+    token (see submit), so the GET starts without waiting.
+    A GET identical to one already in flight (same URL and headers) waits for
+    that request and shares its response instead of hitting the site again.
+    With stream_until=(container selectors, ...) the body is only downloaded
+    until those containers have closed; see parsing.ContainerWatcher.
+    """
+    kwargs.setdefault('timeout', 10)
+    if kwargs.get('stream'):
+        return _fetch(site_key, url, reserved=reserved, **kwargs)
+
+    key = (url, tuple(sorted((kwargs.get('headers') or {}).items())), kwargs.get('stream_until'))
+    with _INFLIGHT_LOCK:
+        future = _INFLIGHT.get(key)
+        leader = future is None
+        if leader:
+            future = _INFLIGHT[key] = Future()
+    if not leader:
+        logger.debug("Coalesced GET %s", url)
+        return future.result()
+
+    try:
+        response = _fetch(site_key, url, reserved=reserved, **kwargs)
+        future.set_result(response)
+        return response
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _INFLIGHT_LOCK:
+            del _INFLIGHT[key]
+
+def submit(site_key, url, **kwargs):
+    """Start a GET in the background and return its Future.
+
+    The rate-limit token is taken here; while the domain's budget is
+    overdrawn the GET waits in DELAYED_STARTS and only then goes to
+    FETCH_EXECUTOR, whose threads never sleep on the rate limiter.
+    """
+    delay = RATE_LIMITER.reserve(site_key, url)
+    if delay <= 0:
+        return FETCH_EXECUTOR.submit(get, site_key, url, reserved=True, **kwargs)
+    future = Future()
+    DELAYED_STARTS.call_later(delay, _start_delayed, future, site_key, url, kwargs)
+    return future
+
+def _start_delayed(future, site_key, url, kwargs):
+    # A fetch cancelled while it waited (see prefetch_pages) is never started
+    if not future.set_running_or_notify_cancel():
+        return
+    started = FETCH_EXECUTOR.submit(get, site_key, url, reserved=True, **kwargs)
+    started.add_done_callback(lambda done: _copy_outcome(done, future))
+
+def _copy_outcome(source, target):
+    error = CancelledError() if source.cancelled() else source.exception()
+    if error is None:
+        target.set_result(source.result())
+    else:
+        target.set_exception(error)
+
+def prefetch_pages(site_key, urls, window=MAX_CONCURRENT_PAGES, **kwargs):
+    """Fetch urls in order, keeping up to `window` requests in flight.
+
+    The first `window` fetches start immediately; the returned iterator
+    yields (url, future) pairs and only requests the next URL once an
+    earlier pair has been handed out, so urls may be endless. Fetches still
+    queued when the caller stops iterating are cancelled.
+    """
+    urls = iter(urls)
+    pending = deque((url, submit(site_key, url, **kwargs)) for url in itertools.islice(urls, window))
+
+    def iterate():
+        try:
+            while pending:
+                yield pending.popleft()
+                for url in itertools.islice(urls, 1):
+                    pending.append((url, submit(site_key, url, **kwargs)))
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+    return iterate()
+
+def crawl(site_key, urls, parse_page, collect, window=MAX_CONCURRENT_PAGES, first_page=1, **kwargs):
+    """Fetch listing pages in order, hand each one to parse_page(page, response) and return collect().
+
+    Pages are numbered from first_page. Crawling stops when parse_page
+    returns False or a page fails to load. Every page is logged as a timing span.
+    """
+    found = 0
+    for page, (url, future) in enumerate(prefetch_pages(site_key, urls, window, **kwargs), first_page):
+        logger.debug("Fetching page %s: %s", page, url)
+        try:
+            response = future.result()
+            response.raise_for_status()
+            logger.debug("Status code: %s", response.status_code)
+            started = time.perf_counter()
+            more = parse_page(page, response)
+            parse_seconds = time.perf_counter() - started
+            total = len(collect())
+            log_span(site_key, url, response, parse_seconds, total - found)
+            found = total
+            if more is False:
+                break
+        except Exception as e:
+            logger.error("Error fetching page %s: %s", page, e)
+            break
+    return collect()
+
+register_domain_listener(reset_pool)
+METRICS.gauge('http_idle_sessions', lambda: {(('site', key),): pool.idle_count() for key, pool in list(_POOLS.items())})
@@ -0,0 +1,47 @@
+import math
+import threading
+import time
+from collections import deque
+from config import LATENCY_HISTORY_SIZE
+
+class LatencyHistory:
+    """Rolling window of request timings and failures per domain."""
+
+    def __init__(self, size=LATENCY_HISTORY_SIZE):
+        self.size = size
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, domain, seconds, ok=True):
+        """Add one request; failed requests count towards the error rate only."""
+        with self._lock:
+            samples = self._samples.get(domain)
+            if samples is None:
+                samples = self._samples[domain] = deque(maxlen=self.size)
+            samples.append((time.time(), seconds if ok else None))
+
+    def summary(self, domain):
+        """Return {'samples', 'errors', 'p50', 'p95'} for a domain, or None if never seen.
+
+        Percentiles are in seconds over the successful requests (None if
+        there were none) using the nearest-rank method.
+        """
+        with self._lock:
+            samples = list(self._samples.get(domain, ()))
+        if not samples:
+            return None
+        timings = sorted(seconds for _, seconds in samples if seconds is not None)
+
+        def percentile(fraction):
+            if not timings:
+                return None
+            return timings[max(0, math.ceil(len(timings) * fraction) - 1)]
+
+        return {
+            'samples': len(samples),
+            'errors': len(samples) - len(timings),
+            'p50': percentile(0.5),
+            'p95': percentile(0.95),
+        }
+
+LATENCY_HISTORY = LatencyHistory()
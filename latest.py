@@ -0,0 +1,116 @@
+import sqlite3
+import threading
+import time
+from config import LATEST_SNAPSHOT_PATH, LATEST_SNAPSHOT_SIZE, LATEST_SEEN_MAX_AGE, logger
+from models import ScrapeResult
+
+class LatestSnapshots:
+    """Each site's latest listing as last crawled, plus the users subscribed to new titles.
+
+    A snapshot belongs to the domain it was crawled from; after a domain
+    change the site has no snapshot until the next crawl. Every crawled URL
+    is also remembered for seen_max_age seconds, beyond the snapshot's
+    size, so only titles not seen in that time count as new. Kept in SQLite
+    so every worker process reads what the crawling worker wrote.
+    """
+
+    def __init__(self, path, size=LATEST_SNAPSHOT_SIZE, seen_max_age=LATEST_SEEN_MAX_AGE):
+        self.size = size
+        self.seen_max_age = seen_max_age
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        with self._lock, self._conn:
+            if path != ':memory:':
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS latest_titles ("
+                "site TEXT, url TEXT, title TEXT, position INTEGER, first_seen REAL, PRIMARY KEY (site, url))"
+            )
+            self._conn.execute("CREATE TABLE IF NOT EXISTS latest_crawls (site TEXT PRIMARY KEY, domain TEXT, crawled_at REAL)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS latest_seen (site TEXT, url TEXT, seen_at REAL, PRIMARY KEY (site, url))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS latest_seen_age ON latest_seen (seen_at)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS subscribers (user_id INTEGER PRIMARY KEY)")
+
+    def _crawled_at(self, site, domain):
+        row = self._conn.execute("SELECT domain, crawled_at FROM latest_crawls WHERE site = ?", (site,)).fetchone()
+        return row[1] if row and row[0] == domain else None
+
+    def get(self, site, domain, max_age):
+        """The site's snapshot as ScrapeResults, or None if it is missing or older than max_age seconds."""
+        with self._lock:
+            crawled_at = self._crawled_at(site, domain)
+            if crawled_at is None or crawled_at < time.time() - max_age:
+                return None
+            rows = self._conn.execute(
+                "SELECT title, url FROM latest_titles WHERE site = ? ORDER BY position", (site,)
+            ).fetchall()
+        return [ScrapeResult(title, url, site, rank) for rank, (title, url) in enumerate(rows, 1)] or None
+
+    def known_urls(self, site, domain):
+        """URLs in the site's snapshot; empty when there is none for this domain."""
+        with self._lock:
+            if self._crawled_at(site, domain) is None:
+                return set()
+            return {url for (url,) in self._conn.execute("SELECT url FROM latest_titles WHERE site = ?", (site,))}
+
+    def update(self, site, domain, results):
+        """Put freshly crawled results on top of the site's snapshot and return the ones not seen before.
+
+        A result is new when it is neither in the snapshot nor among the URLs
+        crawled within seen_max_age. A first crawl (or the first after a
+        domain change) only sets the baseline and returns nothing, so it does
+        not announce a whole listing.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            baseline = self._crawled_at(site, domain) is None
+            if baseline:
+                self._conn.execute("DELETE FROM latest_titles WHERE site = ?", (site,))
+            self._conn.execute("DELETE FROM latest_seen WHERE seen_at < ?", (now - self.seen_max_age,))
+            known = {url for (url,) in self._conn.execute("SELECT url FROM latest_titles WHERE site = ?", (site,))}
+            known.update(url for (url,) in self._conn.execute("SELECT url FROM latest_seen WHERE site = ?", (site,)))
+            fresh = list({result.url: result for result in results}.values())
+            new = [result for result in fresh if result.url not in known]
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO latest_seen (site, url, seen_at) VALUES (?, ?, ?)",
+                [(site, result.url, now) for result in fresh],
+            )
+
+            # The crawled pages in listing order, then what the snapshot had below them
+            crawled = {result.url for result in fresh}
+            older = [url for (url,) in self._conn.execute(
+                "SELECT url FROM latest_titles WHERE site = ? ORDER BY position", (site,)
+            ) if url not in crawled]
+            self._conn.executemany(
+                "INSERT INTO latest_titles (site, url, title, position, first_seen) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(site, url) DO UPDATE SET title = excluded.title, position = excluded.position",
+                [(site, result.url, result.title, position, now) for position, result in enumerate(fresh)],
+            )
+            self._conn.executemany(
+                "UPDATE latest_titles SET position = ? WHERE site = ? AND url = ?",
+                [(position, site, url) for position, url in enumerate(older, len(fresh))],
+            )
+            self._conn.execute("DELETE FROM latest_titles WHERE site = ? AND position >= ?", (site, max(self.size, len(fresh))))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO latest_crawls (site, domain, crawled_at) VALUES (?, ?, ?)", (site, domain, now)
+            )
+        if baseline:
+            logger.info(f"Took a baseline snapshot of {len(fresh)} latest {site} titles")
+            return []
+        return new
+
+    def subscribe(self, user_id):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR IGNORE INTO subscribers (user_id) VALUES (?)", (user_id,))
+
+    def unsubscribe(self, user_id):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM subscribers WHERE user_id = ?", (user_id,))
+
+    def subscribers(self):
+        with self._lock:
+            return [user_id for (user_id,) in self._conn.execute("SELECT user_id FROM subscribers")]
+
+LATEST_SNAPSHOTS = LatestSnapshots(LATEST_SNAPSHOT_PATH)
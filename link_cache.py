@@ -0,0 +1,186 @@
+import json
+import sqlite3
+import threading
+import time
+from config import LINK_CACHE_PATH, LINK_CACHE_TTL, LINK_CACHE_MAX_AGE, logger
+import aio_http
+import async_runtime
+import http_client
+from metrics import METRICS
+from models import ScrapeResult
+from spans import log_span
+
+class CachedLinks:
+    """A cached download-link list with the validators of the page it came from."""
+    __slots__ = ('links', 'etag', 'last_modified', 'fresh')
+
+    def __init__(self, links, etag, last_modified, fresh):
+        self.links = links
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fresh = fresh
+
+class LinkCache:
+    """SQLite-backed download links keyed by movie URL, shared across restarts."""
+
+    def __init__(self, path, ttl, max_age=LINK_CACHE_MAX_AGE):
+        self.ttl = ttl
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            if path != ':memory:':
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS download_links ("
+                "url TEXT PRIMARY KEY, site TEXT, links TEXT, etag TEXT, last_modified TEXT, fetched_at REAL)"
+            )
+        self.purge()
+
+    def get(self, url):
+        """Return CachedLinks for url, or None if nothing usable is stored."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT links, etag, last_modified, fetched_at FROM download_links WHERE url = ?", (url,)
+            ).fetchone()
+        entry = self._decode(row) if row is not None else None
+        # Only fresh entries save a request; stale ones still need revalidating
+        with self._lock:
+            if entry is not None and entry.fresh:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return entry
+
+    def _decode(self, row):
+        links, etag, last_modified, fetched_at = row
+        age = time.time() - fetched_at
+        if age > self.max_age:
+            return None
+        try:
+            links = [ScrapeResult.from_dict(link) for link in json.loads(links)]
+        except (TypeError, KeyError):
+            # Written by an older version that cached formatted strings
+            return None
+        return CachedLinks(links, etag, last_modified, age <= self.ttl)
+
+    def put(self, url, site, links, etag=None, last_modified=None):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO download_links (url, site, links, etag, last_modified, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (url, site, json.dumps([link.to_dict() for link in links]), etag, last_modified, time.time()),
+            )
+
+    def touch(self, url):
+        """Mark an entry fresh again after a successful revalidation."""
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE download_links SET fetched_at = ? WHERE url = ?", (time.time(), url))
+
+    def purge(self):
+        """Delete entries too old to be revalidated."""
+        with self._lock, self._conn:
+            deleted = self._conn.execute(
+                "DELETE FROM download_links WHERE fetched_at < ?", (time.time() - self.max_age,)
+            ).rowcount
+        if deleted:
+            logger.info(f"Purged {deleted} expired download link entries")
+
+LINK_CACHE = LinkCache(LINK_CACHE_PATH, LINK_CACHE_TTL)
+
+class FollowLink:
+    """Returned by an extractor to continue on another page, e.g. hdmovie2's download hop.
+
+    stream_until optionally names the containers after which that page's
+    download can stop (see http_client.get).
+    """
+    __slots__ = ('url', 'extract', 'stream_until')
+
+    def __init__(self, url, extract, stream_until=None):
+        self.url = url
+        self.extract = extract
+        self.stream_until = stream_until
+
+def _conditional_headers(entry):
+    headers = {}
+    if entry and entry.etag:
+        headers['If-None-Match'] = entry.etag
+    if entry and entry.last_modified:
+        headers['If-Modified-Since'] = entry.last_modified
+    return headers
+
+def _extract(site_key, url, extract, response):
+    """Run an extractor on a fetched page and log the request as a timing span."""
+    started = time.perf_counter()
+    links = extract(response)
+    log_span(site_key, url, response, time.perf_counter() - started, 0 if isinstance(links, FollowLink) else len(links))
+    return links
+
+def _store(site_key, movie_url, links, page_response):
+    if links:
+        LINK_CACHE.put(movie_url, site_key, links, page_response.headers.get('ETag'), page_response.headers.get('Last-Modified'))
+    return links
+
+def fetch_links(site_key, movie_url, extract, stream_until=None):
+    """Return download links for movie_url, fetching the page only when needed.
+
+    extract(response) turns a fetched movie page into a link list, or into a
+    FollowLink when the links live on another page. Fresh entries are served
+    from the cache; stale ones are revalidated with a conditional GET when
+    the site sent ETag/Last-Modified. Empty results are not cached.
+    stream_until is passed on to http_client.get for the movie page.
+    """
+    entry = LINK_CACHE.get(movie_url)
+    if entry and entry.fresh:
+        logger.debug("Download link cache hit: %s", movie_url)
+        return entry.links
+
+    headers = _conditional_headers(entry)
+    logger.debug("Fetching movie page: %s", movie_url)
+    response = http_client.get(site_key, movie_url, timeout=10, headers=headers, stream_until=stream_until)
+    if headers:
+        METRICS.inc('link_revalidations_total', result='not_modified' if response.status_code == 304 else 'changed')
+    if headers and response.status_code == 304:
+        logger.debug("Movie page not modified: %s", movie_url)
+        LINK_CACHE.touch(movie_url)
+        return entry.links
+    response.raise_for_status()
+    logger.debug("Status code: %s", response.status_code)
+
+    page_response = response
+    links = _extract(site_key, movie_url, extract, response)
+    while isinstance(links, FollowLink):
+        logger.debug("Fetching download page: %s", links.url)
+        response = http_client.get(site_key, links.url, timeout=10, stream_until=links.stream_until)
+        response.raise_for_status()
+        links = _extract(site_key, links.url, links.extract, response)
+    return _store(site_key, movie_url, links, page_response)
+
+async def afetch_links(site_key, movie_url, extract, stream_until=None):
+    """fetch_links for the async runtime: I/O on the event loop, parsing and SQLite off it."""
+    entry = await async_runtime.run_sync(LINK_CACHE.get, movie_url)
+    if entry and entry.fresh:
+        logger.debug("Download link cache hit: %s", movie_url)
+        return entry.links
+
+    headers = _conditional_headers(entry)
+    logger.debug("Fetching movie page: %s", movie_url)
+    response = await aio_http.get(site_key, movie_url, headers=headers, stream_until=stream_until)
+    if headers:
+        METRICS.inc('link_revalidations_total', result='not_modified' if response.status_code == 304 else 'changed')
+    if headers and response.status_code == 304:
+        logger.debug("Movie page not modified: %s", movie_url)
+        await async_runtime.run_sync(LINK_CACHE.touch, movie_url)
+        return entry.links
+    response.raise_for_status()
+
+    page_response = response
+    links = await aio_http.run_parser(_extract, site_key, movie_url, extract, response)
+    while isinstance(links, FollowLink):
+        logger.debug("Fetching download page: %s", links.url)
+        response = await aio_http.get(site_key, links.url, stream_until=links.stream_until)
+        response.raise_for_status()
+        links = await aio_http.run_parser(_extract, site_key, links.url, links.extract, response)
+    return await async_runtime.run_sync(_store, site_key, movie_url, links, page_response)
@@ -1,8 +1,13 @@
+import asyncio
+import itertools
 import os
 import json
 import logging
-from datetime import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
+from functools import wraps
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import TelegramError, Unauthorized
 from telegram.ext import (
     Updater,
     CommandHandler,
@@ -12,26 +17,178 @@ from telegram.ext import (
     Filters,
     CallbackContext,
 )
-import requests
-import cloudscraper
-from cinevood import get_movie_titles_and_links as cinevood_titles, get_download_links as cinevood_links
-from hdhub4u import get_movie_titles_and_links as hdhub4u_titles, get_download_links as hdhub4u_links
-from hdmovie2 import get_movie_titles_and_links as hdmovie2_titles, get_download_links as hdmovie2_links
-from config import SITE_CONFIG, ALLOWED_IDS, update_site_domain, logger
+import async_runtime
+import health
+import link_cache
+import metrics
+import workers
+from config import (
+    SITE_CONFIG, ALLOWED_IDS, RESULT_CACHE_TTL, RESULT_CACHE_SIZE, RESULT_CACHE_PATH, ALL_SITES_DEADLINE,
+    PREFETCH_DOWNLOAD_LINKS, BOT_RUNTIME, HEALTH_CHECK_INTERVAL, METRICS_PORT, TITLE_INDEX_SEARCH,
+    LATEST_CRAWL_INTERVAL, LATEST_CRAWL_PAGES, LATEST_SNAPSHOT_MAX_AGE, WORKERS, update_site_domain,
+    register_domain_listener, reload_site_config, logger,
+)
+from cache import ResultCache, SharedResultCache
+from circuit import breaker
+from engine import SITES
+from latest import LATEST_SNAPSHOTS
+from latency import LATENCY_HISTORY
+from metrics import METRICS
+from render import SITE_NAMES, format_title, format_download_link, format_health
+from prefetch import PREFETCHER
+from sessions import SESSIONS, ConversationStates
+from title_index import TITLE_INDEX
 
 # States for conversation
 MOVIE_NAME, SITE_SELECTION, MOVIE_SELECTION, DOMAIN_UPDATE, DOMAIN_INPUT = range(5)
 
-# Initialize sessions
-ACTIVE_SESSIONS = {}
+# Scraped listing pages as (results, whether the site has a next page), shared by every
+# session (and every worker process with RESULT_CACHE_PATH)
+if RESULT_CACHE_PATH:
+    RESULT_CACHE = SharedResultCache(RESULT_CACHE_PATH, max_entries=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL)
+else:
+    RESULT_CACHE = ResultCache(max_entries=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL)
+
+def _drop_site_results(site_key, new_domain):
+    """Forget a site's cached pages once it moves; they were scraped from the old domain."""
+    RESULT_CACHE.invalidate(lambda key: key[0] == site_key)
+
+# Runs on /update_domain, mirror switches and config reloads alike
+register_domain_listener(_drop_site_results)
+
+def _hit_ratio(cache):
+    lookups = cache.hits + cache.misses
+    return cache.hits / lookups if lookups else 0.0
+
+METRICS.gauge("active_sessions", lambda: len(SESSIONS))
+METRICS.gauge("result_cache_entries", lambda: len(RESULT_CACHE))
+METRICS.gauge("result_cache_hit_ratio", lambda: _hit_ratio(RESULT_CACHE))
+METRICS.gauge("link_cache_hit_ratio", lambda: _hit_ratio(link_cache.LINK_CACHE))
+METRICS.gauge("title_index_titles", lambda: len(TITLE_INDEX))
+
+# Runs one scrape per site for "All Sites" searches
+SEARCH_EXECUTOR = ThreadPoolExecutor(max_workers=6, thread_name_prefix="search")
+
+# Live searches behind answers served from the title index, one per result key at a time;
+# _REFRESHING maps each key being refreshed to the callbacks waiting for its live page
+REFRESH_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix="refresh")
+_REFRESHING = {}
+_REFRESHING_LOCK = threading.Lock()
+
+# Titles per page of a result list
+TITLES_PER_PAGE = 10
+
+# Most new titles listed per site in one subscription message
+NOTIFY_MAX_TITLES = 30
+
+# With BOT_RUNTIME=async the handlers return at once and the scrape runs on the event loop
+ASYNC_RUNTIME = BOT_RUNTIME == "async"
+
+# One lock per user, held while a handler or a coroutine it started touches the stored session.
+# A user's updates all go to the same worker process, so a process-local lock is enough.
+_SESSION_LOCKS = {}
+_SESSION_LOCKS_LOCK = threading.Lock()
+
+def _session_lock(user_id):
+    with _SESSION_LOCKS_LOCK:
+        lock = _SESSION_LOCKS.get(user_id)
+        if lock is None:
+            lock = _SESSION_LOCKS[user_id] = threading.RLock()
+        return lock
+
+# Task numbers for with_session. Drawn per process, not per session, so a session cleared
+# and started again never hands a stale coroutine's number to a new update.
+_TASKS = itertools.count(1)
+
+class DetachedContext:
+    """A coroutine's own copy of the session of the update that started it.
+
+    The next update reloads context.user_data in place, so a coroutine that
+    outlives its handler must not share that dict. Each update gets a task
+    number never used before in this process (see with_session); a detached
+    context only writes back, clears, or edits messages for a session still
+    on the task it was copied from.
+    """
+
+    def __init__(self, context: CallbackContext):
+        self.bot = context.bot
+        self.user_data = dict(context.user_data)
+        self.task = context.user_data.get("task")
+
+def _owns_session(user_id, context):
+    if not isinstance(context, DetachedContext):
+        return True
+    stored = SESSIONS.load(user_id)
+    return stored is not None and stored.get("task") == context.task
+
+def save_detached(user_id, context):
+    """Write a detached context's session back to the store.
+
+    Returns False, writing nothing, once a newer update has taken over the
+    session. Inside a handler this is a no-op; with_session saves.
+    """
+    if not isinstance(context, DetachedContext):
+        return True
+    with _session_lock(user_id):
+        if not _owns_session(user_id, context):
+            logger.debug("Dropped stale session update for user %s", user_id)
+            return False
+        SESSIONS.save(user_id, context.user_data)
+        return True
+
+def show_detached(update: Update, context, show, *args):
+    """Call show(*args) only while context still owns the user's session.
+
+    Holds the session lock, so a newer update can't take over between the
+    check and the edit. Returns False when the edit was dropped.
+    """
+    user_id = update.effective_user.id
+    with _session_lock(user_id):
+        if not _owns_session(user_id, context):
+            logger.debug("Dropped stale message edit for user %s", user_id)
+            return False
+        show(*args)
+        return True
 
 def clear_session(user_id, context: CallbackContext):
     """Clear active session for a user."""
-    if user_id in ACTIVE_SESSIONS:
-        del ACTIVE_SESSIONS[user_id]
-        logger.debug(f"Cleared session for user {user_id}")
+    with _session_lock(user_id):
+        if not _owns_session(user_id, context):
+            return
+        SESSIONS.delete(user_id)
+    logger.debug("Cleared session for user %s", user_id)
+    PREFETCHER.cancel(user_id)
     context.user_data.clear()
 
+def with_session(handler):
+    """Run a handler with the user's stored session in context.user_data, saving it afterwards.
+
+    The store, not this process, holds the session, so whichever worker gets
+    the next update picks up where this one left off. Coroutines the handler
+    starts get a DetachedContext, and wait for the save before writing back.
+    """
+    @wraps(handler)
+    def wrapper(update: Update, context: CallbackContext):
+        user_id = update.effective_user.id
+        with _session_lock(user_id):
+            context.user_data.clear()
+            context.user_data.update(SESSIONS.load(user_id) or {})
+            context.user_data["task"] = next(_TASKS)
+            try:
+                return handler(update, context)
+            finally:
+                SESSIONS.save(user_id, context.user_data)
+    return wrapper
+
+def site_keyboard(include_all=True):
+    """One button per defined site, then "All Sites" (optional) and "Cancel"."""
+    keyboard = [[InlineKeyboardButton(name, callback_data=key)] for key, name in SITE_NAMES.items()]
+    if include_all:
+        keyboard.append([InlineKeyboardButton("All Sites", callback_data="all")])
+    keyboard.append([InlineKeyboardButton("Cancel", callback_data="cancel")])
+    return InlineKeyboardMarkup(keyboard)
+
+@with_session
 def start(update: Update, context: CallbackContext) -> int:
     user_id = update.effective_user.id
     if user_id not in ALLOWED_IDS:
@@ -39,13 +196,14 @@ def start(update: Update, context: CallbackContext) -> int:
         return ConversationHandler.END
 
     clear_session(user_id, context)
-    ACTIVE_SESSIONS[user_id] = {"start_time": datetime.now()}
+    SESSIONS.start(user_id)
     update.message.reply_text("Enter movie name to search:")
     return MOVIE_NAME
 
+@with_session
 def movie_name(update: Update, context: CallbackContext) -> int:
     user_id = update.effective_user.id
-    if user_id not in ACTIVE_SESSIONS:
+    if user_id not in SESSIONS:
         update.message.reply_text("Session expired. Use /start_movie to begin.")
         return ConversationHandler.END
 
@@ -56,16 +214,11 @@ def movie_name(update: Update, context: CallbackContext) -> int:
 
     context.user_data["movie_name"] = movie_name
     context.user_data["mode"] = "search"
-    keyboard = [
-        [InlineKeyboardButton("Cinevood", callback_data="cinevood")],
-        [InlineKeyboardButton("HDHub4u", callback_data="hdhub4u")],
-        [InlineKeyboardButton("HDMovie2", callback_data="hdmovie2")],
-        [InlineKeyboardButton("Cancel", callback_data="cancel")],
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = site_keyboard()
     update.message.reply_text(f"Select a site to search for '{movie_name}':", reply_markup=reply_markup)
     return SITE_SELECTION
 
+@with_session
 def latest_movies(update: Update, context: CallbackContext) -> int:
     user_id = update.effective_user.id
     if user_id not in ALLOWED_IDS:
@@ -73,24 +226,19 @@ def latest_movies(update: Update, context: CallbackContext) -> int:
         return ConversationHandler.END
 
     clear_session(user_id, context)
-    ACTIVE_SESSIONS[user_id] = {"start_time": datetime.now()}
+    SESSIONS.start(user_id)
     context.user_data["mode"] = "latest"
-    keyboard = [
-        [InlineKeyboardButton("Cinevood", callback_data="cinevood")],
-        [InlineKeyboardButton("HDHub4u", callback_data="hdhub4u")],
-        [InlineKeyboardButton("HDMovie2", callback_data="hdmovie2")],
-        [InlineKeyboardButton("Cancel", callback_data="cancel")],
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = site_keyboard()
     update.message.reply_text("Select a site for latest movies:", reply_markup=reply_markup)
     return SITE_SELECTION
 
+@with_session
 def site_selection(update: Update, context: CallbackContext) -> int:
     query = update.callback_query
     query.answer()
     user_id = query.from_user.id
 
-    if user_id not in ACTIVE_SESSIONS:
+    if user_id not in SESSIONS:
         query.message.reply_text("Session expired. Use /start_movie to begin.")
         return ConversationHandler.END
 
@@ -100,9 +248,204 @@ def site_selection(update: Update, context: CallbackContext) -> int:
         return ConversationHandler.END
 
     context.user_data["site"] = query.data
-    fetch_movies(update, context, page=1)
+    if ASYNC_RUNTIME and query.data == "all":
+        async_runtime.submit(fetch_all_sites_async(update, DetachedContext(context)))
+    elif ASYNC_RUNTIME:
+        async_runtime.submit(fetch_movies_async(update, DetachedContext(context)))
+    elif query.data == "all":
+        fetch_all_sites(update, context)
+    else:
+        fetch_movies(update, context, page=1)
     return MOVIE_SELECTION
 
+def _results_key(site, mode, movie_name, page):
+    return (site, SITE_CONFIG[site], mode, movie_name.lower() if movie_name else None, page)
+
+def get_movie_results(site, mode, movie_name, page=1, on_refresh=None):
+    """Return (ScrapeResults, whether the site has a next page) for one listing page, scraping only on a cache miss.
+
+    Page 1 may instead come from the latest snapshot or, for callers passing
+    on_refresh, the title index; those answers are whole lists, with no site
+    page to continue from. After an index answer the site is searched in the
+    background and on_refresh(results, more) gets its live first page.
+    """
+    if page == 1:
+        snapshot = _snapshot_results(site, mode)
+        if snapshot:
+            return snapshot, False
+
+    cache_key = _results_key(site, mode, movie_name, page)
+    cached = RESULT_CACHE.get(cache_key)
+    if cached is not None:
+        logger.debug("Result cache hit: %s", cache_key)
+        return cached
+
+    if page == 1 and on_refresh:
+        indexed = _indexed_results(site, mode, movie_name)
+        if indexed:
+            if _claim_refresh(cache_key, on_refresh):
+                REFRESH_EXECUTOR.submit(refresh_movie_results, site, movie_name, cache_key)
+            return indexed, False
+
+    results, more = SITES[site].get_listing_page(movie_name, page)
+    if results:
+        RESULT_CACHE.set(cache_key, (results, more))
+    return results, more
+
+def _snapshot_results(site, mode):
+    """The background crawl's snapshot of a latest listing, or None when the site has to be asked."""
+    if mode != "latest" or not LATEST_CRAWL_INTERVAL:
+        return None
+    results = LATEST_SNAPSHOTS.get(site, SITE_CONFIG[site], LATEST_SNAPSHOT_MAX_AGE)
+    if results:
+        METRICS.inc("latest_snapshot_answers_total", site=site)
+    return results
+
+def _indexed_results(site, mode, movie_name):
+    """Title index matches for a search, or [] when the site has to be asked."""
+    if mode != "search" or not movie_name or not TITLE_INDEX_SEARCH:
+        return []
+    results = TITLE_INDEX.search(movie_name, site=site)
+    if results:
+        METRICS.inc("title_index_answers_total", site=site)
+    return results
+
+def _claim_refresh(cache_key, on_refresh):
+    """Queue on_refresh for cache_key's live page; True if the caller has to start the refresh."""
+    with _REFRESHING_LOCK:
+        waiting = _REFRESHING.get(cache_key)
+        if waiting is not None:
+            waiting.append(on_refresh)
+            return False
+        _REFRESHING[cache_key] = [on_refresh]
+        return True
+
+def _release_refresh(cache_key):
+    with _REFRESHING_LOCK:
+        return _REFRESHING.pop(cache_key, [])
+
+def refresh_movie_results(site, movie_name, cache_key):
+    """Search the site live after an answer from the title index and show the result to everyone waiting on it."""
+    results = None
+    try:
+        results, more = SITES[site].get_listing_page(movie_name, 1)
+        if results:
+            RESULT_CACHE.set(cache_key, (results, more))
+    except Exception as e:
+        logger.error(f"Error refreshing {site} results for '{movie_name}': {e}")
+    finally:
+        callbacks = _release_refresh(cache_key)
+    # Without live results the index answer stays up
+    if results:
+        for callback in callbacks:
+            callback(results, more)
+
+async def arefresh_movie_results(site, movie_name, cache_key):
+    """refresh_movie_results for the async runtime."""
+    results = None
+    try:
+        results, more = await SITES[site].aget_listing_page(movie_name, 1)
+        if results:
+            RESULT_CACHE.set(cache_key, (results, more))
+    except Exception as e:
+        logger.error(f"Error refreshing {site} results for '{movie_name}': {e}")
+    finally:
+        callbacks = _release_refresh(cache_key)
+    if results:
+        for callback in callbacks:
+            await async_runtime.run_sync(callback, results, more)
+
+def _show_refreshed(update: Update, context: CallbackContext, site: str, mode: str, movie_name):
+    """on_refresh callback replacing a title index answer on the user's screen with the site's live first page.
+
+    It works on a DetachedContext, so nothing is shown once the user has
+    moved on, and checks the stored session still asks for this site and
+    query before editing; the live page also restarts the cursor for Next.
+    """
+    context = DetachedContext(context)
+    user_id = update.effective_user.id
+
+    def show(results, more):
+        with _session_lock(user_id):
+            stored = SESSIONS.load(user_id) or {}
+            stored_mode = stored.get("mode", "search")
+            stored_name = stored.get("movie_name") if stored_mode == "search" else None
+            if (stored.get("site"), stored_mode, stored_name) != (site, mode, movie_name):
+                logger.debug("Dropped live %s results the session no longer asks for", site)
+                return
+            set_results(context, site, results, more)
+            try:
+                show_movie_page(update, context, 1)
+            except TelegramError as e:
+                logger.warning(f"Could not show live {site} results: {e}")
+    return show
+
+async def aget_movie_results(site, mode, movie_name, page=1, on_refresh=None):
+    """get_movie_results for the async runtime."""
+    if page == 1:
+        snapshot = await async_runtime.run_sync(_snapshot_results, site, mode)
+        if snapshot:
+            return snapshot, False
+
+    cache_key = _results_key(site, mode, movie_name, page)
+    cached = RESULT_CACHE.get(cache_key)
+    if cached is not None:
+        logger.debug("Result cache hit: %s", cache_key)
+        return cached
+
+    if page == 1 and on_refresh:
+        indexed = await async_runtime.run_sync(_indexed_results, site, mode, movie_name)
+        if indexed:
+            if _claim_refresh(cache_key, on_refresh):
+                async_runtime.submit(arefresh_movie_results(site, movie_name, cache_key))
+            return indexed, False
+
+    results, more = await SITES[site].aget_listing_page(movie_name, page)
+    if results:
+        RESULT_CACHE.set(cache_key, (results, more))
+    return results, more
+
+def get_download_links(site, movie_url):
+    """Return the download links for a movie page on the given site."""
+    return SITES[site].get_download_links(movie_url)
+
+def show_movie_page(update: Update, context: CallbackContext, page: int, footer: str = ""):
+    """Render one page of the session's result list."""
+    results = context.user_data["results"]
+    mode = context.user_data.get("mode", "search")
+    show_site = context.user_data.get("results_site") == "all"
+    last_page = max(1, -(-len(results) // TITLES_PER_PAGE))
+    if page > last_page:
+        # Next was offered but the site had no more pages after all
+        page, footer = last_page, footer + "\n\nNo more results."
+    context.user_data["page"] = page
+    if not save_detached(update.effective_user.id, context):
+        # The user has moved on since this coroutine started
+        return
+
+    start_idx = (page - 1) * TITLES_PER_PAGE
+    end_idx = start_idx + TITLES_PER_PAGE
+    page_titles = [format_title(i + 1, result, show_site) for i, result in enumerate(results[start_idx:end_idx], start_idx)]
+
+    keyboard = [[InlineKeyboardButton(title, callback_data=str(i + start_idx + 1))] for i, title in enumerate(page_titles)]
+    nav_buttons = []
+    if page > 1:
+        nav_buttons.append(InlineKeyboardButton("Previous", callback_data="prev"))
+    if end_idx < len(results) or context.user_data.get("next_page"):
+        nav_buttons.append(InlineKeyboardButton("Next", callback_data="next"))
+    nav_buttons.append(InlineKeyboardButton("Back to Sites", callback_data="back_to_sites"))
+    keyboard.append(nav_buttons)
+    reply_markup = InlineKeyboardMarkup(keyboard)
+
+    text = f"{'Search' if mode == 'search' else 'Latest'} Movies (Page {page}):\n\n" + "\n".join(page_titles) + footer
+    query = update.callback_query
+    with METRICS.timer("telegram_seconds", method="edit_text"):
+        query.message.edit_text(text, reply_markup=reply_markup)
+
+    if PREFETCH_DOWNLOAD_LINKS:
+        PREFETCHER.schedule(update.effective_user.id, results[start_idx:end_idx], get_download_links)
+
+@METRICS.timed("handler_seconds", handler="fetch_movies")
 def fetch_movies(update: Update, context: CallbackContext, page: int):
     user_id = update.effective_user.id
     site = context.user_data["site"]
@@ -110,41 +453,23 @@ def fetch_movies(update: Update, context: CallbackContext, page: int):
     movie_name = context.user_data.get("movie_name", None) if mode == "search" else None
 
     try:
-        logger.debug(f"Fetching movies: site={site}, mode={mode}, movie_name={movie_name}, page={page}")
-        if site == "cinevood":
-            titles, links = cinevood_titles(movie_name, max_pages=1)
-        elif site == "hdhub4u":
-            titles, links = hdhub4u_titles(movie_name, max_pages=1)
-        else:
-            titles, links = hdmovie2_titles(movie_name, max_pages=1)
-
-        if not titles:
-            query = update.callback_query
-            query.message.edit_text("No movies found. Try another site or name.")
-            clear_session(user_id, context)
-            return ConversationHandler.END
-
-        context.user_data["titles"] = titles
-        context.user_data["links"] = links
-        context.user_data["page"] = page
-
-        start_idx = (page - 1) * 10  # Changed to 10 for 10-button gap
-        end_idx = start_idx + 10
-        page_titles = titles[start_idx:end_idx]
-
-        keyboard = [[InlineKeyboardButton(title, callback_data=str(i + start_idx + 1))] for i, title in enumerate(page_titles)]
-        nav_buttons = []
-        if page > 1:
-            nav_buttons.append(InlineKeyboardButton("Previous", callback_data="prev"))
-        if end_idx < len(titles):
-            nav_buttons.append(InlineKeyboardButton("Next", callback_data="next"))
-        nav_buttons.append(InlineKeyboardButton("Back to Sites", callback_data="back_to_sites"))
-        keyboard.append(nav_buttons)
-        reply_markup = InlineKeyboardMarkup(keyboard)
-
-        text = f"{'Search' if mode == 'search' else 'Latest'} Movies (Page {page}):\n\n" + "\n".join(page_titles)
-        query = update.callback_query
-        query.message.edit_text(text, reply_markup=reply_markup)
+        if context.user_data.get("results") and context.user_data.get("results_site") == site:
+            # Paging through a list we already have: the site is only asked for the page after it
+            if ASYNC_RUNTIME and _needs_more(context, page):
+                async_runtime.submit(show_more_async(update, DetachedContext(context), page))
+                return
+            load_more(context, page)
+            show_movie_page(update, context, page)
+            return
+        if site == "all":
+            fetch_all_sites(update, context)
+            return
+
+        logger.debug("Fetching movies: site=%s, mode=%s, movie_name=%s, page=%s", site, mode, movie_name, page)
+        results, more = get_movie_results(site, mode, movie_name, on_refresh=_show_refreshed(update, context, site, mode, movie_name))
+        set_results(context, site, results, more)
+        load_more(context, page)
+        return show_results(update, context, page)
 
     except Exception as e:
         logger.error(f"Error fetching movies: {e}")
@@ -153,12 +478,185 @@ def fetch_movies(update: Update, context: CallbackContext, page: int):
         clear_session(user_id, context)
         return ConversationHandler.END
 
+def set_results(context: CallbackContext, site: str, results, more):
+    """Make a site's first page the session's result list; more says whether the site has another page."""
+    context.user_data.update(results=results, results_site=site, next_page=2 if results and more else None)
+
+def _needs_more(context: CallbackContext, page: int):
+    """Whether showing page needs results past the buffered ones, and the site has more to give."""
+    return bool(context.user_data.get("next_page")) and page * TITLES_PER_PAGE > len(context.user_data["results"])
+
+def _add_page(context: CallbackContext, results, more):
+    listed = {result.url for result in context.user_data["results"]}
+    new = [result for result in results if result.url not in listed]
+    # A new list, since the old one may be the result cache's own
+    context.user_data["results"] = context.user_data["results"] + new
+    # A page with nothing new (a repeat, or past the end) ends the list too
+    context.user_data["next_page"] = context.user_data["next_page"] + 1 if more and new else None
+
+def load_more(context: CallbackContext, page: int):
+    """Fetch the site's next pages into the session, one at a time, until page can be shown in full.
+
+    Earlier pages are never fetched again; a user who stays on the first
+    screen costs one site page.
+    """
+    site = context.user_data["results_site"]
+    mode = context.user_data.get("mode", "search")
+    movie_name = context.user_data.get("movie_name", None) if mode == "search" else None
+    while _needs_more(context, page):
+        logger.debug("Loading %s page %s", site, context.user_data["next_page"])
+        METRICS.inc("result_pages_loaded_total", site=site)
+        _add_page(context, *get_movie_results(site, mode, movie_name, context.user_data["next_page"]))
+
+async def aload_more(context: CallbackContext, page: int):
+    """load_more for the async runtime."""
+    site = context.user_data["results_site"]
+    mode = context.user_data.get("mode", "search")
+    movie_name = context.user_data.get("movie_name", None) if mode == "search" else None
+    while _needs_more(context, page):
+        logger.debug("Loading %s page %s", site, context.user_data["next_page"])
+        METRICS.inc("result_pages_loaded_total", site=site)
+        _add_page(context, *await aget_movie_results(site, mode, movie_name, context.user_data["next_page"]))
+
+async def show_more_async(update: Update, context: CallbackContext, page: int):
+    """Next past the buffered results, for the async runtime: load on the event loop, then render."""
+    try:
+        await aload_more(context, page)
+        await async_runtime.run_sync(show_movie_page, update, context, page)
+
+    except Exception as e:
+        logger.error(f"Error fetching movies: {e}")
+        await async_runtime.run_sync(update.callback_query.message.edit_text, "Error fetching movies. Try again later.")
+
+def show_results(update: Update, context: CallbackContext, page: int = 1):
+    """Show a freshly fetched result list, ending the conversation when it is empty."""
+    if not context.user_data["results"]:
+        if not _owns_session(update.effective_user.id, context):
+            return
+        query = update.callback_query
+        query.message.edit_text("No movies found. Try another site or name.")
+        clear_session(update.effective_user.id, context)
+        return ConversationHandler.END
+
+    show_movie_page(update, context, page)
+
+async def fetch_movies_async(update: Update, context: CallbackContext):
+    """fetch_movies for the async runtime: scrape on the event loop, then render."""
+    site = context.user_data["site"]
+    mode = context.user_data.get("mode", "search")
+    movie_name = context.user_data.get("movie_name", None) if mode == "search" else None
+
+    try:
+        logger.debug("Fetching movies: site=%s, mode=%s, movie_name=%s", site, mode, movie_name)
+        results, more = await aget_movie_results(site, mode, movie_name, on_refresh=_show_refreshed(update, context, site, mode, movie_name))
+        set_results(context, site, results, more)
+        await aload_more(context, 1)
+        await async_runtime.run_sync(show_results, update, context)
+
+    except Exception as e:
+        logger.error(f"Error fetching movies: {e}")
+        await async_runtime.run_sync(update.callback_query.message.edit_text, "Error fetching movies. Try again later.")
+        await async_runtime.run_sync(clear_session, update.effective_user.id, context)
+
+def fetch_all_sites(update: Update, context: CallbackContext):
+    """Query every site at once and update the message as each one answers.
+
+    A site that has not answered within ALL_SITES_DEADLINE is left out so a
+    slow or blocked mirror cannot hold back the others.
+    """
+    mode = context.user_data.get("mode", "search")
+    movie_name = context.user_data.get("movie_name", None) if mode == "search" else None
+    query = update.callback_query
+    query.message.edit_text(f"Searching {len(SITE_NAMES)} sites...")
+
+    futures = {SEARCH_EXECUTOR.submit(get_movie_results, site, mode, movie_name): site for site in SITE_NAMES}
+    pending = set(SITE_NAMES)
+    results = []
+    # Each site's first page only; there is no single next page to load
+    context.user_data.update(results=results, results_site="all", next_page=None)
+
+    try:
+        for future in as_completed(futures, timeout=ALL_SITES_DEADLINE):
+            site = futures[future]
+            pending.discard(site)
+            try:
+                results.extend(future.result()[0])
+            except Exception as e:
+                logger.error(f"Error fetching movies from {site}: {e}")
+            show_all_sites_progress(update, context, pending)
+    except FuturesTimeoutError:
+        logger.warning(f"All-sites search gave up on: {', '.join(sorted(pending))}")
+
+    return finish_all_sites(update, context, pending)
+
+def show_all_sites_progress(update: Update, context: CallbackContext, pending):
+    """Show what the sites that answered so far returned, and who is still missing.
+
+    A failed edit (e.g. "message is not modified", or a network error) is
+    only logged; the search goes on and the final render still happens.
+    """
+    results = context.user_data["results"]
+    waiting = f"Waiting for: {', '.join(SITE_NAMES[s] for s in sorted(pending))}" if pending else ""
+    try:
+        if results:
+            show_movie_page(update, context, 1, f"\n\n{waiting}" if waiting else "")
+        elif pending:
+            update.callback_query.message.edit_text(f"Searching {len(SITE_NAMES)} sites... {waiting}")
+    except TelegramError as e:
+        logger.warning(f"Could not update all-sites progress: {e}")
+
+def finish_all_sites(update: Update, context: CallbackContext, pending):
+    """Final render of an "All Sites" search once every site answered or the deadline passed."""
+    if not context.user_data["results"]:
+        if not _owns_session(update.effective_user.id, context):
+            return
+        update.callback_query.message.edit_text("No movies found. Try another site or name.")
+        clear_session(update.effective_user.id, context)
+        return ConversationHandler.END
+
+    if pending:
+        show_movie_page(update, context, 1, f"\n\nNo answer from: {', '.join(SITE_NAMES[s] for s in sorted(pending))}")
+
+async def fetch_all_sites_async(update: Update, context: CallbackContext):
+    """fetch_all_sites for the async runtime: one task per site on the event loop."""
+    mode = context.user_data.get("mode", "search")
+    movie_name = context.user_data.get("movie_name", None) if mode == "search" else None
+    await async_runtime.run_sync(update.callback_query.message.edit_text, f"Searching {len(SITE_NAMES)} sites...")
+
+    tasks = {asyncio.ensure_future(aget_movie_results(site, mode, movie_name)): site for site in SITE_NAMES}
+    pending = set(SITE_NAMES)
+    results = []
+    context.user_data.update(results=results, results_site="all", next_page=None)
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + ALL_SITES_DEADLINE
+    running = set(tasks)
+    while running:
+        done, running = await asyncio.wait(running, timeout=deadline - loop.time(), return_when=asyncio.FIRST_COMPLETED)
+        if not done:
+            logger.warning(f"All-sites search gave up on: {', '.join(sorted(pending))}")
+            break
+        for task in done:
+            site = tasks[task]
+            pending.discard(site)
+            try:
+                results.extend(task.result()[0])
+            except Exception as e:
+                logger.error(f"Error fetching movies from {site}: {e}")
+        await async_runtime.run_sync(show_all_sites_progress, update, context, pending)
+
+    for task in running:
+        task.cancel()
+    await async_runtime.run_sync(finish_all_sites, update, context, pending)
+
+@with_session
+@METRICS.timed("handler_seconds", handler="movie_selection")
 def movie_selection(update: Update, context: CallbackContext) -> int:
     query = update.callback_query
     query.answer()
     user_id = query.from_user.id
 
-    if user_id not in ACTIVE_SESSIONS:
+    if user_id not in SESSIONS:
         query.message.reply_text("Session expired. Use /start_movie to begin.")
         return ConversationHandler.END
 
@@ -176,13 +674,7 @@ def movie_selection(update: Update, context: CallbackContext) -> int:
         return MOVIE_SELECTION
     elif query.data == "back_to_sites":
         mode = context.user_data.get("mode", "search")
-        keyboard = [
-            [InlineKeyboardButton("Cinevood", callback_data="cinevood")],
-            [InlineKeyboardButton("HDHub4u", callback_data="hdhub4u")],
-            [InlineKeyboardButton("HDMovie2", callback_data="hdmovie2")],
-            [InlineKeyboardButton("Cancel", callback_data="cancel")],
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = site_keyboard()
         text = f"Select a site to search for '{context.user_data['movie_name']}'" if mode == "search" else "Select a site for latest movies:"
         query.message.edit_text(text, reply_markup=reply_markup)
         return SITE_SELECTION
@@ -193,33 +685,23 @@ def movie_selection(update: Update, context: CallbackContext) -> int:
 
     try:
         selection = int(query.data) - 1
-        if selection < 0 or selection >= len(context.user_data["links"]):
+        if selection < 0 or selection >= len(context.user_data["results"]):
             query.message.edit_text("Invalid selection. Try again.")
             return MOVIE_SELECTION
 
-        movie_url = context.user_data["links"][selection]
-        site = context.user_data["site"]
+        result = context.user_data["results"][selection]
+        movie_url = result.url
+        site = result.site
+
+        if ASYNC_RUNTIME:
+            async_runtime.submit(send_download_links_async(update, DetachedContext(context), result))
+            return MOVIE_SELECTION
 
         try:
-            logger.debug(f"Fetching download links for {movie_url} from {site}")
-            if site == "cinevood":
-                download_links = cinevood_links(movie_url)
-            elif site == "hdhub4u":
-                download_links = hdhub4u_links(movie_url)
-            else:
-                download_links = hdmovie2_links(movie_url)
-
-            if download_links:
-                text = "Download Links:\n\n" + "\n".join(download_links)
-            else:
-                text = "No download links found."
-
-            keyboard = [
-                [InlineKeyboardButton("Back to Movie List", callback_data="back_to_list")],
-                [InlineKeyboardButton("Back to Sites", callback_data="back_to_sites")],
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            query.message.edit_text(text, reply_markup=reply_markup)
+            logger.debug("Fetching download links for %s from %s", movie_url, site)
+            # A running prefetch fills the link cache; wait for it rather than fetch twice
+            download_links = PREFETCHER.wait(movie_url) or get_download_links(site, movie_url)
+            show_download_links(update, download_links)
 
         except Exception as e:
             logger.error(f"Error fetching download links for {movie_url}: {e}")
@@ -232,6 +714,38 @@ def movie_selection(update: Update, context: CallbackContext) -> int:
         query.message.edit_text("Invalid input. Select a valid option.")
         return MOVIE_SELECTION
 
+def show_download_links(update: Update, download_links):
+    """Replace the title list with a movie's download links."""
+    if download_links:
+        text = "Download Links:\n\n" + "\n".join(format_download_link(link) for link in download_links)
+    else:
+        text = "No download links found."
+
+    keyboard = [
+        [InlineKeyboardButton("Back to Movie List", callback_data="back_to_list")],
+        [InlineKeyboardButton("Back to Sites", callback_data="back_to_sites")],
+    ]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    with METRICS.timer("telegram_seconds", method="edit_text"):
+        update.callback_query.message.edit_text(text, reply_markup=reply_markup)
+
+async def send_download_links_async(update: Update, context: DetachedContext, result):
+    """movie_selection's download step for the async runtime."""
+    try:
+        logger.debug("Fetching download links for %s from %s", result.url, result.site)
+        download_links = await async_runtime.run_sync(PREFETCHER.wait, result.url)
+        if not download_links:
+            download_links = await SITES[result.site].aget_download_links(result.url)
+        await async_runtime.run_sync(show_detached, update, context, show_download_links, update, download_links)
+
+    except Exception as e:
+        logger.error("Error fetching download links for %s: %s", result.url, e)
+        await async_runtime.run_sync(
+            show_detached, update, context,
+            update.callback_query.message.edit_text, "Error fetching download links. Try again later.",
+        )
+
+@with_session
 def update_domain(update: Update, context: CallbackContext) -> int:
     user_id = update.effective_user.id
     if user_id not in ALLOWED_IDS:
@@ -239,23 +753,18 @@ def update_domain(update: Update, context: CallbackContext) -> int:
         return ConversationHandler.END
 
     clear_session(user_id, context)
-    ACTIVE_SESSIONS[user_id] = {"start_time": datetime.now()}
-    keyboard = [
-        [InlineKeyboardButton("Cinevood", callback_data="cinevood")],
-        [InlineKeyboardButton("HDHub4u", callback_data="hdhub4u")],
-        [InlineKeyboardButton("HDMovie2", callback_data="hdmovie2")],
-        [InlineKeyboardButton("Cancel", callback_data="cancel")],
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    SESSIONS.start(user_id)
+    reply_markup = site_keyboard(include_all=False)
     update.message.reply_text("Select site to update domain:", reply_markup=reply_markup)
     return DOMAIN_UPDATE
 
+@with_session
 def domain_selection(update: Update, context: CallbackContext) -> int:
     query = update.callback_query
     query.answer()
     user_id = query.from_user.id
 
-    if user_id not in ACTIVE_SESSIONS:
+    if user_id not in SESSIONS:
         query.message.reply_text("Session expired. Use /update_domain to retry.")
         return ConversationHandler.END
 
@@ -268,9 +777,10 @@ def domain_selection(update: Update, context: CallbackContext) -> int:
     query.message.edit_text(f"Enter new domain for {query.data} (e.g., hdmovie2.new):")
     return DOMAIN_INPUT
 
+@with_session
 def domain_input(update: Update, context: CallbackContext) -> int:
     user_id = update.effective_user.id
-    if user_id not in ACTIVE_SESSIONS:
+    if user_id not in SESSIONS:
         update.message.reply_text("Session expired. Use /update_domain to retry.")
         return ConversationHandler.END
 
@@ -292,20 +802,21 @@ def status(update: Update, context: CallbackContext):
         return
 
     clear_session(user_id, context)
-    scraper = cloudscraper.create_scraper()
     status_text = "Current Site Status:\n\n"
-    for site_key, domain in SITE_CONFIG.items():
-        url = f"https://{domain}/"
-        try:
-            response = scraper.get(url, timeout=5)
-            status_code = response.status_code
-            status_text += f"{site_key.capitalize()}: {status_code} {'OK' if status_code == 200 else 'Error'}\n"
-        except Exception as e:
-            logger.error(f"Error checking status for {site_key}: {e}")
-            status_text += f"{site_key.capitalize()}: Error ({str(e)})\n"
+    for probe in health.probe_all():
+        status_text += format_health(probe, LATENCY_HISTORY.summary(probe.domain), breaker(probe.domain).is_open) + "\n"
 
     update.message.reply_text(status_text)
 
+def metrics_command(update: Update, context: CallbackContext):
+    user_id = update.effective_user.id
+    if user_id not in ALLOWED_IDS:
+        update.message.reply_text("Unauthorized access. Contact admin.")
+        return
+
+    # Telegram rejects messages over 4096 characters
+    update.message.reply_text(METRICS.render_text()[:4000])
+
 def cancel(update: Update, context: CallbackContext) -> int:
     user_id = update.effective_user.id
     clear_session(user_id, context)
@@ -323,20 +834,97 @@ def cmd(update: Update, context: CallbackContext):
         "/start_movie - Start a new movie search",
         "/latest_movies - View latest movies",
         "/status - Check current site status",
+        "/metrics - Show timings, counters and cache hit ratios",
+        "/subscribe - Get new titles from every site as they appear",
+        "/unsubscribe - Stop new-title messages",
         "/update_domain - Update domain for a site",
         "/cancel - Cancel current operation",
         "/cmd - Display this command list",
     ]
     update.message.reply_text("\n".join(commands))
 
+def subscribe(update: Update, context: CallbackContext):
+    user_id = update.effective_user.id
+    if user_id not in ALLOWED_IDS:
+        update.message.reply_text("Unauthorized access. Contact admin.")
+        return
+    if not LATEST_CRAWL_INTERVAL:
+        update.message.reply_text("New-title messages are turned off on this bot.")
+        return
+
+    LATEST_SNAPSHOTS.subscribe(user_id)
+    update.message.reply_text("Subscribed. New titles will be sent here as they appear. Use /unsubscribe to stop.")
+
+def unsubscribe(update: Update, context: CallbackContext):
+    LATEST_SNAPSHOTS.unsubscribe(update.effective_user.id)
+    update.message.reply_text("Unsubscribed from new-title messages.")
+
 def timeout_check(context: CallbackContext):
-    current_time = datetime.now()
-    for user_id, session in list(ACTIVE_SESSIONS.items()):
-        if (current_time - session["start_time"]).total_seconds() > 1800:  # 30 minutes
-            clear_session(user_id, context)
-            context.bot.send_message(user_id, "Session timed out. Use /start_movie to begin again.")
+    """Tell users whose session ran out; only the sessions that are due are looked at."""
+    for user_id in SESSIONS.pop_expired():
+        PREFETCHER.cancel(user_id)
+        context.bot.send_message(user_id, "Session timed out. Use /start_movie to begin again.")
 
-def main():
+def expired_button(update: Update, context: CallbackContext):
+    """Answer a button from a conversation whose session has ended."""
+    query = update.callback_query
+    query.answer()
+    query.message.reply_text("Session expired. Use /start_movie to begin.")
+
+def health_check(context: CallbackContext):
+    """Probe every mirror and route each site to its fastest healthy one."""
+    # Jobs run between updates, so pick up what other workers saved first
+    reload_site_config()
+    health.check_mirrors()
+
+def crawl_latest(context: CallbackContext):
+    """Refresh every site's latest snapshot and send subscribers the titles it had not seen.
+
+    Pages are read only up to the first one with a title already in the
+    snapshot. Everything crawled also lands in the title index.
+    """
+    reload_site_config()
+    new_titles = {}
+    for site, scraper in SITES.items():
+        domain = SITE_CONFIG[site]
+        try:
+            known = LATEST_SNAPSHOTS.known_urls(site, domain)
+            results = scraper.get_movie_titles_and_links(None, max_pages=LATEST_CRAWL_PAGES, known=known)
+            if results:
+                new_titles[site] = LATEST_SNAPSHOTS.update(site, domain, results)
+                METRICS.inc("latest_new_titles_total", len(new_titles[site]), site=site)
+        except Exception as e:
+            logger.error(f"Error crawling latest {site} titles: {e}")
+    TITLE_INDEX.purge()
+    notify_subscribers(context.bot, {site: new for site, new in new_titles.items() if new})
+
+def notify_subscribers(bot, new_titles):
+    """Send every subscriber one message per site with its new titles."""
+    if not new_titles:
+        return
+    for user_id in LATEST_SNAPSHOTS.subscribers():
+        for site, results in new_titles.items():
+            text = f"New on {SITE_NAMES[site]}:\n\n" + "\n".join(
+                format_title(i, result) for i, result in enumerate(results[:NOTIFY_MAX_TITLES], 1)
+            )
+            if len(results) > NOTIFY_MAX_TITLES:
+                text += f"\n...and {len(results) - NOTIFY_MAX_TITLES} more"
+            try:
+                bot.send_message(user_id, text + "\n\nUse /latest_movies for download links.")
+            except Unauthorized:
+                # The user blocked the bot
+                LATEST_SNAPSHOTS.unsubscribe(user_id)
+                logger.info(f"Unsubscribed {user_id}, who blocked the bot")
+                break
+            except TelegramError as e:
+                logger.error(f"Error sending new titles to {user_id}: {e}")
+
+def build_updater(worker=0):
+    """Create the Updater with every handler and job registered.
+
+    Site-wide background jobs (mirror health checks, latest-listing crawls) run
+    on worker 0 only; every worker expires the sessions it holds.
+    """
     updater = Updater(os.environ["TELEGRAM_BOT_TOKEN"], use_context=True)
     dp = updater.dispatcher
 
@@ -355,18 +943,39 @@ def main():
         },
         fallbacks=[CommandHandler("cancel", cancel)],
     )
+    # Conversation states live with the sessions, in the shared store
+    conv_handler.conversations = ConversationStates(SESSIONS)
 
     dp.add_handler(conv_handler)
+    dp.add_handler(CallbackQueryHandler(expired_button))
     dp.add_handler(CommandHandler("status", status))
     dp.add_handler(CommandHandler("cmd", cmd))
+    dp.add_handler(CommandHandler("metrics", metrics_command))
+    dp.add_handler(CommandHandler("subscribe", subscribe))
+    dp.add_handler(CommandHandler("unsubscribe", unsubscribe))
     updater.job_queue.run_repeating(timeout_check, interval=30)
+    if worker == 0:
+        updater.job_queue.run_repeating(health_check, interval=HEALTH_CHECK_INTERVAL, first=30)
+        if LATEST_CRAWL_INTERVAL:
+            updater.job_queue.run_repeating(crawl_latest, interval=LATEST_CRAWL_INTERVAL, first=60)
+
+    if METRICS_PORT:
+        # Metrics are per process, so each worker serves its own on the next port up
+        metrics.start_prometheus_server(METRICS_PORT + worker)
+    return updater
 
+def main():
     port = int(os.environ.get("PORT", 8080))
     webhook_url = os.environ.get("WEBHOOK_URL")
     if not webhook_url:
         logger.error("WEBHOOK_URL not set")
         raise ValueError("WEBHOOK_URL environment variable not set")
 
+    if WORKERS > 1:
+        workers.serve(build_updater, port, webhook_url)
+        return
+
+    updater = build_updater()
     updater.start_webhook(
         listen="0.0.0.0",
         port=port,
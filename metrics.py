@@ -0,0 +1,220 @@
+import asyncio
+import bisect
+import threading
+import time
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config import logger
+
+# Upper bounds (seconds) of the latency histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+class Histogram:
+    """Cumulative-bucket latency histogram, as Prometheus expects it."""
+    __slots__ = ('counts', 'count', 'sum')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, q):
+        """Estimate a quantile by interpolating inside its bucket (like histogram_quantile)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = BUCKETS[i - 1] if i else 0.0
+                if i == len(BUCKETS):
+                    return lower
+                return lower + (BUCKETS[i] - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return BUCKETS[-1]
+
+class Metrics:
+    """Process-wide counters, latency histograms and callback gauges.
+
+    Series are keyed by name plus keyword labels, e.g.
+    observe('stage_seconds', 0.2, site='hdhub4u', stage='parse').
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self._counters = {}
+        self._histograms = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def gauge(self, name, read):
+        """Register read() -> number, or -> {labels tuple: number}, sampled on every export."""
+        self._gauges[name] = read
+
+    def timer(self, name, **labels):
+        """Context manager observing the time spent in its block."""
+        return _Timer(self, name, labels)
+
+    def timed(self, name, **labels):
+        """Decorator observing every call of a function or coroutine function."""
+        def decorate(fn):
+            if asyncio.iscoroutinefunction(fn):
+                @wraps(fn)
+                async def async_wrapper(*args, **kwargs):
+                    with self.timer(name, **labels):
+                        return await fn(*args, **kwargs)
+                return async_wrapper
+
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.timer(name, **labels):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def _gauge_values(self):
+        values = {}
+        for name, read in list(self._gauges.items()):
+            try:
+                value = read()
+            except Exception as e:
+                logger.error("Error reading gauge %s: %s", name, e)
+                continue
+            if isinstance(value, dict):
+                for labels, sample in value.items():
+                    values[(name, labels)] = sample
+            else:
+                values[(name, ())] = value
+        return values
+
+    def snapshot(self):
+        """Return (counters, histograms, gauges) dicts keyed by (name, labels)."""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: _copy(histogram) for key, histogram in self._histograms.items()}
+        return counters, histograms, self._gauge_values()
+
+    def render_text(self):
+        """Short human-readable report for the /metrics command."""
+        counters, histograms, gauges = self.snapshot()
+        uptime = int(time.time() - self.started)
+        lines = [f"Uptime: {uptime // 3600}h {uptime % 3600 // 60}m", "", "Latency (n, p50, p95):"]
+        for (name, labels), histogram in sorted(histograms.items()):
+            lines.append(
+                f"{_series(name, labels)}: {histogram.count}, "
+                f"{_ms(histogram.quantile(0.5))}, {_ms(histogram.quantile(0.95))}"
+            )
+        lines += ["", "Counters:"]
+        lines += [f"{_series(name, labels)}: {value}" for (name, labels), value in sorted(counters.items())]
+        lines += ["", "Gauges:"]
+        lines += [f"{_series(name, labels)}: {_number(value)}" for (name, labels), value in sorted(gauges.items())]
+        return "\n".join(lines)
+
+    def render_prometheus(self):
+        """Prometheus text exposition of every series."""
+        counters, histograms, gauges = self.snapshot()
+        lines = []
+        typed = set()
+
+        def declare(name, kind):
+            # One TYPE line per family, ahead of its first series
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE bot_{name} {kind}")
+
+        for (name, labels), value in sorted(counters.items()):
+            declare(name, "counter")
+            lines.append(f"bot_{name}{_labels(labels)} {value}")
+        for (name, labels), histogram in sorted(histograms.items()):
+            declare(name, "histogram")
+            cumulative = 0
+            for bound, bucket_count in zip(BUCKETS + ('+Inf',), histogram.counts):
+                cumulative += bucket_count
+                lines.append(f"bot_{name}_bucket{_labels(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"bot_{name}_sum{_labels(labels)} {histogram.sum}")
+            lines.append(f"bot_{name}_count{_labels(labels)} {histogram.count}")
+        for (name, labels), value in sorted(gauges.items()):
+            declare(name, "gauge")
+            lines.append(f"bot_{name}{_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+class _Timer:
+    __slots__ = ('metrics', 'name', 'labels', 'started')
+
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe(self.name, time.perf_counter() - self.started, **self.labels)
+        if exc_type is not None:
+            # e.g. scrape_seconds -> scrape_errors_total
+            self.metrics.inc(self.name.replace('_seconds', '_errors_total'), **self.labels)
+
+def _copy(histogram):
+    copy = Histogram()
+    copy.counts = list(histogram.counts)
+    copy.count = histogram.count
+    copy.sum = histogram.sum
+    return copy
+
+def _series(name, labels):
+    return name + (f" [{', '.join(str(value) for _, value in labels)}]" if labels else "")
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+def _ms(seconds):
+    return "-" if seconds is None else f"{seconds * 1000:.0f} ms"
+
+def _number(value):
+    return f"{value:.2f}" if isinstance(value, float) else str(value)
+
+METRICS = Metrics()
+
+class _PrometheusHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip('/') != '/metrics':
+            self.send_error(404)
+            return
+        body = METRICS.render_prometheus().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_prometheus_server(port):
+    """Serve /metrics in Prometheus text format on its own port, in a daemon thread."""
+    server = ThreadingHTTPServer(('0.0.0.0', port), _PrometheusHandler)
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    logger.info(f"Serving Prometheus metrics on port {port}")
+    return server
@@ -0,0 +1,41 @@
+import re
+
+_QUALITY_RE = re.compile(r'\b(2160p|4k|1080p|720p|576p|480p|360p)\b', re.IGNORECASE)
+_SIZE_RE = re.compile(r'\b(\d+(?:\.\d+)?\s?[GM]B)\b', re.IGNORECASE)
+
+class ScrapeResult:
+    """One scraped movie title or download link.
+
+    rank is the 1-based position within the site's own result list; quality
+    and size are picked out of the title when not given.
+    """
+    __slots__ = ('title', 'url', 'site', 'rank', 'quality', 'size')
+
+    def __init__(self, title, url, site, rank, quality=None, size=None):
+        self.title = title
+        self.url = url
+        self.site = site
+        self.rank = rank
+        if quality is None:
+            match = _QUALITY_RE.search(title)
+            quality = match.group(1).lower() if match else None
+        if size is None:
+            match = _SIZE_RE.search(title)
+            size = match.group(1).upper().replace(' ', '') if match else None
+        self.quality = quality
+        self.size = size
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['title'], data['url'], data['site'], data['rank'], data.get('quality'), data.get('size'))
+
+    def __eq__(self, other):
+        if not isinstance(other, ScrapeResult):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"ScrapeResult({self.site!r}, {self.rank}, {self.title!r}, {self.url!r})"
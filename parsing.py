@@ -0,0 +1,110 @@
+import os
+import re
+from html.parser import HTMLParser
+from bs4 import BeautifulSoup, SoupStrainer
+from config import logger
+
+def _detect_parser():
+    """Pick the fastest tree builder available, honouring HTML_PARSER."""
+    requested = os.environ.get('HTML_PARSER')
+    if requested:
+        return requested
+    try:
+        import lxml  # noqa: F401
+        return 'lxml'
+    except ImportError:
+        return 'html.parser'
+
+PARSER = _detect_parser()
+logger.info(f"Using HTML parser backend: {PARSER}")
+
+_SELECTOR_RE = re.compile(r'^([\w-]*)((?:[.#][\w-]+)*)$')
+_STRAINERS = {}
+
+def _compile_selector(selector):
+    """Split a 'tag.class#id' selector into (tag, classes, id)."""
+    match = _SELECTOR_RE.match(selector)
+    if not match:
+        raise ValueError(f"Unsupported container selector: {selector}")
+    tag, rest = match.groups()
+    classes = set(re.findall(r'\.([\w-]+)', rest))
+    ids = re.findall(r'#([\w-]+)', rest)
+    return tag or None, classes, ids[0] if ids else None
+
+def _matches(compiled, name, attrs):
+    """True if a tag with this name and attrs matches a compiled container selector."""
+    tag, classes, tag_id = compiled
+    if tag and name != tag:
+        return False
+    if tag_id and attrs.get('id') != tag_id:
+        return False
+    if classes:
+        tag_classes = attrs.get('class') or ''
+        if isinstance(tag_classes, str):
+            tag_classes = tag_classes.split()
+        if not classes.issubset(tag_classes):
+            return False
+    return True
+
+def strainer(containers):
+    """Build (and memoise) a SoupStrainer that keeps only the given containers.
+
+    containers are simple 'tag.class#id' selectors; a matching element is
+    kept with its whole subtree, everything outside is skipped while parsing.
+    """
+    containers = tuple(containers)
+    if containers in _STRAINERS:
+        return _STRAINERS[containers]
+
+    compiled = [_compile_selector(selector) for selector in containers]
+
+    def matches(name, attrs):
+        attrs = attrs or {}
+        return any(_matches(selector, name, attrs) for selector in compiled)
+
+    _STRAINERS[containers] = SoupStrainer(matches)
+    return _STRAINERS[containers]
+
+class ContainerWatcher(HTMLParser):
+    """Scans a page as it downloads and tells when every given container has closed.
+
+    containers use the same 'tag.class#id' selectors as strainer(). Only the
+    nesting of the containers' own tags is tracked, which is all it takes to
+    know the part of the page a scraper reads is complete. Chunks are decoded
+    as latin-1: tag, id and class names are ASCII in any page encoding.
+    """
+
+    def __init__(self, containers):
+        super().__init__(convert_charrefs=False)
+        self._waiting = {selector: _compile_selector(selector) for selector in containers}
+        # selector -> [tag name, open depth] while that container is being read
+        self._open = {}
+        self.done = not self._waiting
+
+    def feed_bytes(self, chunk):
+        """Scan the next chunk of the body; returns True once every container has closed."""
+        if not self.done:
+            self.feed(chunk.decode('latin-1'))
+        return self.done
+
+    def handle_starttag(self, tag, attrs):
+        for state in self._open.values():
+            if state[0] == tag:
+                state[1] += 1
+        for selector, compiled in self._waiting.items():
+            if selector not in self._open and _matches(compiled, tag, dict(attrs)):
+                self._open[selector] = [tag, 1]
+
+    def handle_endtag(self, tag):
+        for selector, state in list(self._open.items()):
+            if state[0] == tag:
+                state[1] -= 1
+                if not state[1]:
+                    del self._open[selector]
+                    del self._waiting[selector]
+        self.done = not self._waiting
+
+def parse(html, containers=None):
+    """Parse html with the configured backend, optionally keeping only containers."""
+    parse_only = strainer(containers) if containers else None
+    return BeautifulSoup(html, PARSER, parse_only=parse_only)
@@ -0,0 +1,71 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from config import PREFETCH_WORKERS, logger
+from ratelimit import RATE_LIMITER
+
+# Tokens left untouched so prefetching never delays a request a user is waiting on
+RESERVED_TOKENS = 2
+
+class LinkPrefetcher:
+    """Warm the download link cache for the titles a user is looking at.
+
+    Work runs on its own small pool, is skipped while a site's rate budget is
+    nearly spent, and is cancelled when the user's session ends or they move
+    to another page. Identical URLs requested by several users share one job.
+    """
+
+    def __init__(self, workers=PREFETCH_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='prefetch')
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._inflight = {}
+
+    def schedule(self, user_id, results, fetch):
+        """Queue fetch(result) for each result, replacing the user's earlier jobs."""
+        self.cancel(user_id)
+        futures = []
+        with self._lock:
+            for result in results:
+                future = self._inflight.get(result.url)
+                if future is None:
+                    future = self._executor.submit(self._run, result, fetch)
+                    self._inflight[result.url] = future
+                    future.add_done_callback(lambda _, url=result.url: self._forget(url))
+                futures.append(future)
+            self._jobs[user_id] = futures
+        logger.debug("Prefetching download links for %s titles for user %s", len(futures), user_id)
+
+    def _run(self, result, fetch):
+        if RATE_LIMITER.available(result.site, result.url) < RESERVED_TOKENS:
+            logger.debug("Skipping prefetch of %s: %s rate budget is low", result.url, result.site)
+            return None
+        return fetch(result.site, result.url)
+
+    def _forget(self, url):
+        with self._lock:
+            self._inflight.pop(url, None)
+
+    def cancel(self, user_id):
+        """Drop a user's queued prefetches; running ones finish into the cache."""
+        with self._lock:
+            futures = self._jobs.pop(user_id, [])
+            shared = {id(future) for jobs in self._jobs.values() for future in jobs}
+        for future in futures:
+            if id(future) not in shared:
+                future.cancel()
+
+    def wait(self, url, timeout=15):
+        """Block until an in-flight prefetch of url finishes; return its links or None."""
+        with self._lock:
+            future = self._inflight.get(url)
+        if future is None:
+            return None
+        try:
+            return future.result(timeout=timeout)
+        except FuturesTimeoutError:
+            return None
+        except Exception as e:
+            logger.error("Prefetch of %s failed: %s", url, e)
+            return None
+
+PREFETCHER = LinkPrefetcher()
@@ -0,0 +1,149 @@
+import sqlite3
+import threading
+import time
+from urllib.parse import urlparse
+from config import RATE_LIMIT_PATH, SITE_RATE_LIMITS, logger
+
+# Used for sites missing from SITE_RATE_LIMITS
+DEFAULT_LIMITS = {'rate': 0.5, 'burst': 6}
+
+class TokenBucket:
+    """Token bucket refilled at `rate` tokens per second up to `burst` tokens."""
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Take one token and return how long the caller must wait before using it.
+
+        Tokens may go negative, which queues concurrent callers behind each
+        other instead of letting them all wake up at the same moment.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def available(self):
+        """Tokens that could be taken right now without waiting."""
+        with self._lock:
+            return min(self.burst, self.tokens + (time.monotonic() - self.updated) * self.rate)
+
+    def resize(self, rate, burst):
+        """Switch to new limits, keeping the tokens earned at the old rate so far."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(float(burst), self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.rate = float(rate)
+            self.burst = float(burst)
+
+class SharedTokenBucket:
+    """TokenBucket kept in a SQLite row, so every process using the file shares it."""
+
+    def __init__(self, conn, lock, host, rate, burst):
+        self._conn = conn
+        self._lock = lock
+        self.host = host
+        self.rate = float(rate)
+        self.burst = float(burst)
+
+    def _refill(self, now):
+        row = self._conn.execute("SELECT tokens, updated FROM buckets WHERE host = ?", (self.host,)).fetchone()
+        if row is None:
+            return self.burst
+        tokens, updated = row
+        return min(self.burst, tokens + max(now - updated, 0) * self.rate)
+
+    def reserve(self):
+        """Same as TokenBucket.reserve, read and written in one transaction."""
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            # Wall-clock time: monotonic clocks are not comparable between processes
+            now = time.time()
+            tokens = self._refill(now) - 1
+            self._conn.execute(
+                "INSERT OR REPLACE INTO buckets (host, tokens, updated) VALUES (?, ?, ?)", (self.host, tokens, now)
+            )
+        if tokens >= 0:
+            return 0.0
+        return -tokens / self.rate
+
+    def available(self):
+        with self._lock:
+            return self._refill(time.time())
+
+    def resize(self, rate, burst):
+        """Switch to new limits; the stored tokens are capped at the new burst on the next refill."""
+        with self._lock:
+            self.rate = float(rate)
+            self.burst = float(burst)
+
+class RateLimiter:
+    """Per-domain request budgets shared by every thread in the process."""
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _new_bucket(self, host, rate, burst):
+        return TokenBucket(rate, burst)
+
+    def _bucket(self, site_key, host):
+        limits = SITE_RATE_LIMITS.get(site_key, DEFAULT_LIMITS)
+        rate, burst = float(limits['rate']), float(limits['burst'])
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = self._new_bucket(host, rate, burst)
+                self._buckets[host] = bucket
+            elif (bucket.rate, bucket.burst) != (rate, burst):
+                # SITE_RATE_LIMITS changed since, e.g. on a config reload
+                logger.info("Rate limit for %s is now %s/s, burst %s", host, rate, burst)
+                bucket.resize(rate, burst)
+            return bucket
+
+    def available(self, site_key, url):
+        """Requests the domain could serve right now without waiting."""
+        host = urlparse(url).hostname or site_key
+        return self._bucket(site_key, host).available()
+
+    def reserve(self, site_key, url):
+        """Take a request from the domain's budget; returns the seconds to wait first."""
+        host = urlparse(url).hostname or site_key
+        delay = self._bucket(site_key, host).reserve()
+        if delay > 0:
+            logger.debug("Rate limiting %s: waiting %.2fs", host, delay)
+        return delay
+
+    def acquire(self, site_key, url):
+        """Block only for the time the domain's budget is overdrawn."""
+        delay = self.reserve(site_key, url)
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+class SharedRateLimiter(RateLimiter):
+    """RateLimiter whose budgets live in a SQLite file, shared by every worker process on the host."""
+
+    def __init__(self, path):
+        super().__init__()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._db_lock = threading.Lock()
+        with self._db_lock, self._conn:
+            if path != ':memory:':
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS buckets (host TEXT PRIMARY KEY, tokens REAL, updated REAL)")
+
+    def _new_bucket(self, host, rate, burst):
+        return SharedTokenBucket(self._conn, self._db_lock, host, rate, burst)
+
+RATE_LIMITER = SharedRateLimiter(RATE_LIMIT_PATH) if RATE_LIMIT_PATH else RateLimiter()
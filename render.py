@@ -0,0 +1,38 @@
+from config import SITE_DEFINITIONS
+
+# Display name per site key, in keyboard order
+SITE_NAMES = {key: definition['name'] for key, definition in SITE_DEFINITIONS.items()}
+
+def format_title(number, result, show_site=False):
+    """Text for one entry of a title list; number is its position in the list."""
+    if show_site:
+        return f"{number}. [{SITE_NAMES.get(result.site, result.site)}] {result.title}"
+    return f"{number}. {result.title}"
+
+def format_download_link(result):
+    """Text for one download link, in the bold-label style Telegram shows."""
+    return f"{result.rank}) **{result.title}** : {result.url}\n"
+
+def _ms(seconds):
+    return "-" if seconds is None else f"{seconds * 1000:.0f} ms"
+
+def format_health(probe, summary=None, circuit_open=False):
+    """Text block for one site in /status: probe phases plus its rolling p50/p95."""
+    name = SITE_NAMES.get(probe.site, probe.site)
+    if probe.error:
+        lines = [f"{name} ({probe.domain}): Error ({probe.error})"]
+    else:
+        lines = [f"{name} ({probe.domain}): {probe.status_code} {'OK' if probe.status_code == 200 else 'Error'}"]
+    if circuit_open:
+        lines[0] += " [circuit open]"
+    if probe.dns is not None:
+        lines.append(
+            f"  dns {_ms(probe.dns)} · connect {_ms(probe.connect)} · tls {_ms(probe.tls)}"
+            f" · ttfb {_ms(probe.ttfb)} · total {_ms(probe.total)}"
+        )
+    if summary:
+        lines.append(
+            f"  last {summary['samples']}: p50 {_ms(summary['p50'])} · p95 {_ms(summary['p95'])}"
+            f" · errors {summary['errors'] * 100 // summary['samples']}%"
+        )
+    return "\n".join(lines) + "\n"
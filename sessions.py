@@ -0,0 +1,257 @@
+import heapq
+import json
+import sqlite3
+import threading
+import time
+from collections.abc import MutableMapping
+from config import SESSION_STORE, SESSION_STORE_PATH, SESSION_TIMEOUT, logger
+from models import ScrapeResult
+
+class MemorySessionStore:
+    """Sessions in this process, expired through a heap ordered by expiry time.
+
+    A session is its data dict plus the conversation states of its user,
+    and lives SESSION_TIMEOUT seconds from start(). pop_expired() only looks
+    at the sessions that are due, so its cost does not grow with the number
+    of live sessions.
+    """
+
+    def __init__(self, timeout=SESSION_TIMEOUT):
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        # user_id -> [expires_at, data, conversation states]
+        self._sessions = {}
+        # (expires_at, user_id); entries of restarted or deleted sessions are skipped when popped
+        self._expiry = []
+
+    def start(self, user_id):
+        """Begin a fresh session for user_id, replacing any earlier one."""
+        expires_at = time.time() + self.timeout
+        with self._lock:
+            self._sessions[user_id] = [expires_at, {}, {}]
+            heapq.heappush(self._expiry, (expires_at, user_id))
+
+    def _live(self, user_id):
+        record = self._sessions.get(user_id)
+        return record if record is not None and record[0] > time.time() else None
+
+    def load(self, user_id):
+        """Return a copy of the session's data, or None if it has ended."""
+        with self._lock:
+            record = self._live(user_id)
+            return dict(record[1]) if record else None
+
+    def save(self, user_id, data):
+        """Store data for a live session; a session that already ended stays ended."""
+        with self._lock:
+            record = self._live(user_id)
+            if record:
+                record[1] = dict(data)
+
+    def delete(self, user_id):
+        with self._lock:
+            self._sessions.pop(user_id, None)
+
+    def get_state(self, user_id, key):
+        with self._lock:
+            record = self._live(user_id)
+            return record[2].get(key) if record else None
+
+    def set_state(self, user_id, key, state):
+        with self._lock:
+            record = self._live(user_id)
+            if record:
+                record[2][key] = state
+
+    def delete_state(self, user_id, key):
+        with self._lock:
+            record = self._sessions.get(user_id)
+            if record:
+                record[2].pop(key, None)
+
+    def states(self):
+        """Yield (user_id, key) for every stored conversation state."""
+        with self._lock:
+            items = [(user_id, key) for user_id, record in self._sessions.items() for key in record[2]]
+        yield from items
+
+    def pop_expired(self):
+        """Remove and return the users whose sessions have run out."""
+        now = time.time()
+        expired = []
+        with self._lock:
+            while self._expiry and self._expiry[0][0] <= now:
+                expires_at, user_id = heapq.heappop(self._expiry)
+                record = self._sessions.get(user_id)
+                if record is not None and record[0] == expires_at:
+                    del self._sessions[user_id]
+                    expired.append(user_id)
+        return expired
+
+    def __contains__(self, user_id):
+        with self._lock:
+            return self._live(user_id) is not None
+
+    def __len__(self):
+        """Live sessions; ones that ran out but are not yet popped don't count."""
+        now = time.time()
+        with self._lock:
+            return sum(1 for record in self._sessions.values() if record[0] > now)
+
+def _encode(data):
+    """JSON for session data, with result lists as [site, rank, title, url] rows."""
+    data = dict(data)
+    if data.get('results'):
+        data['results'] = [[result.site, result.rank, result.title, result.url] for result in data['results']]
+    return json.dumps(data, separators=(',', ':'))
+
+def _decode(text):
+    data = json.loads(text)
+    if data.get('results'):
+        data['results'] = [ScrapeResult(title, url, site, rank) for site, rank, title, url in data['results']]
+    return data
+
+class SQLiteSessionStore:
+    """Sessions in a SQLite file, shared by every bot process on the host.
+
+    Same interface as MemorySessionStore. Expiry goes through an index on
+    expires_at, and pop_expired() claims due sessions inside one write
+    transaction so only one process reports each of them.
+    """
+
+    def __init__(self, path, timeout=SESSION_TIMEOUT):
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        with self._lock, self._conn:
+            if path != ':memory:':
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "user_id INTEGER PRIMARY KEY, data TEXT, states TEXT, expires_at REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_expiry ON sessions (expires_at)")
+
+    def start(self, user_id):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (user_id, data, states, expires_at) VALUES (?, '{}', '{}', ?)",
+                (user_id, time.time() + self.timeout),
+            )
+
+    def _row(self, column, user_id):
+        row = self._conn.execute(
+            f"SELECT {column} FROM sessions WHERE user_id = ? AND expires_at > ?", (user_id, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def load(self, user_id):
+        with self._lock:
+            data = self._row('data', user_id)
+        return _decode(data) if data is not None else None
+
+    def save(self, user_id, data):
+        encoded = _encode(data)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE sessions SET data = ? WHERE user_id = ? AND expires_at > ?", (encoded, user_id, time.time())
+            )
+
+    def delete(self, user_id):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+
+    def get_state(self, user_id, key):
+        with self._lock:
+            states = self._row('states', user_id)
+        return json.loads(states).get(key) if states else None
+
+    def _update_states(self, user_id, update):
+        # Read and write in one transaction so concurrent workers do not lose each other's states
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            states = self._row('states', user_id)
+            if states is None:
+                return
+            states = json.loads(states)
+            update(states)
+            self._conn.execute("UPDATE sessions SET states = ? WHERE user_id = ?", (json.dumps(states), user_id))
+
+    def set_state(self, user_id, key, state):
+        self._update_states(user_id, lambda states: states.__setitem__(key, state))
+
+    def delete_state(self, user_id, key):
+        self._update_states(user_id, lambda states: states.pop(key, None))
+
+    def states(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT user_id, states FROM sessions WHERE expires_at > ?", (time.time(),)
+            ).fetchall()
+        for user_id, states in rows:
+            for key in json.loads(states):
+                yield user_id, key
+
+    def pop_expired(self):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            expired = [row[0] for row in self._conn.execute(
+                "SELECT user_id FROM sessions WHERE expires_at <= ?", (now,)
+            )]
+            if expired:
+                self._conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,))
+        return expired
+
+    def __contains__(self, user_id):
+        with self._lock:
+            return self._row('1', user_id) is not None
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sessions WHERE expires_at > ?", (time.time(),)).fetchone()[0]
+
+class ConversationStates(MutableMapping):
+    """ConversationHandler.conversations backed by a session store.
+
+    Keys are the handler's (chat_id, user_id) tuples; a state is kept with
+    its user's session, so it ends with the session and any process using
+    the same store can carry the conversation on.
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    @staticmethod
+    def _key(key):
+        return ','.join(str(part) for part in key)
+
+    def __getitem__(self, key):
+        state = self.store.get_state(key[-1], self._key(key))
+        if state is None:
+            raise KeyError(key)
+        return state
+
+    def __setitem__(self, key, state):
+        self.store.set_state(key[-1], self._key(key), state)
+
+    def __delitem__(self, key):
+        self.store.delete_state(key[-1], self._key(key))
+
+    def __iter__(self):
+        for _, key in self.store.states():
+            yield tuple(int(part) for part in key.split(','))
+
+    def __len__(self):
+        return sum(1 for _ in self.store.states())
+
+def create_store(kind=SESSION_STORE):
+    """Build the session store named by SESSION_STORE ("memory" or "sqlite")."""
+    if kind == 'sqlite':
+        logger.info(f"Keeping sessions in {SESSION_STORE_PATH}")
+        return SQLiteSessionStore(SESSION_STORE_PATH)
+    if kind != 'memory':
+        logger.warning(f"Unknown SESSION_STORE {kind!r}, keeping sessions in memory")
+    return MemorySessionStore()
+
+SESSIONS = create_store()
@@ -0,0 +1,28 @@
+import logging
+from metrics import METRICS
+
+SPAN_LOGGER = logging.getLogger('spans')
+
+def log_span(site_key, url, response, parse_seconds, results):
+    """Log one scraper request as a key=value line on the "spans" logger.
+
+    fetch_ms is the response's own elapsed time (request sent to headers
+    received); the same fields are attached to the record as `span` for
+    handlers that want them structured. Parse time also goes to METRICS.
+    """
+    METRICS.observe('stage_seconds', parse_seconds, site=site_key, stage='parse')
+    if not SPAN_LOGGER.isEnabledFor(logging.INFO):
+        return
+    span = {
+        'site': site_key,
+        'url': url,
+        'bytes': len(response.content),
+        'fetch_ms': response.elapsed.total_seconds() * 1000,
+        'parse_ms': parse_seconds * 1000,
+        'results': results,
+    }
+    SPAN_LOGGER.info(
+        "span site=%s url=%s bytes=%d fetch_ms=%.0f parse_ms=%.0f results=%d",
+        site_key, url, span['bytes'], span['fetch_ms'], span['parse_ms'], results,
+        extra={'span': span},
+    )
@@ -0,0 +1,158 @@
+import re
+import sqlite3
+import threading
+import time
+from config import TITLE_INDEX_PATH, TITLE_INDEX_MAX_AGE, TITLE_INDEX_MIN_SCORE, logger
+from models import ScrapeResult
+
+_WORD_RE = re.compile(r'\w+')
+
+# Most candidates FTS hands back for re-ranking per query
+CANDIDATE_LIMIT = 200
+
+def _trigrams(text):
+    """Lowercased three-letter slices of every word; shorter words count whole."""
+    grams = set()
+    for word in _WORD_RE.findall(text.lower()):
+        if len(word) < 3:
+            grams.add(word)
+        else:
+            grams.update(word[i:i + 3] for i in range(len(word) - 2))
+    return grams
+
+def _score(grams, title):
+    """Share of the query's grams found in title; a short word matches any word it starts.
+
+    Short numbers must match a whole word, so "Pushpa 2" does not match a "(2021)".
+    """
+    title_grams = _trigrams(title)
+    words = None
+    matched = 0
+    for gram in grams:
+        if gram in title_grams:
+            matched += 1
+        elif len(gram) < 3:
+            if words is None:
+                words = _WORD_RE.findall(title.lower())
+            matched += any(word == gram if gram.isdigit() else word.startswith(gram) for word in words)
+    return matched / len(grams)
+
+class TitleIndex:
+    """SQLite full-text index of every title the scrapers have listed.
+
+    Matching is by shared trigrams, so typos and partial words still find
+    a title; matches are ranked by how much of the query they cover, newest
+    sighting first on ties. Without FTS5's trigram tokenizer (SQLite older
+    than 3.34) candidates come from a LIKE scan instead.
+    """
+
+    def __init__(self, path, max_age=TITLE_INDEX_MAX_AGE, min_score=TITLE_INDEX_MIN_SCORE):
+        self.max_age = max_age
+        self.min_score = min_score
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            if path != ':memory:':
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS titles ("
+                "id INTEGER PRIMARY KEY, url TEXT UNIQUE, site TEXT, title TEXT, seen_at REAL)"
+            )
+            self.fts = self._create_fts()
+        self.purge()
+
+    def _create_fts(self):
+        try:
+            self._conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS titles_fts USING fts5("
+                "title, content='titles', content_rowid='id', tokenize='trigram')"
+            )
+        except sqlite3.OperationalError as e:
+            logger.warning(f"FTS5 trigram index unavailable, title search falls back to LIKE: {e}")
+            return False
+        # Keep the FTS table in step with titles
+        self._conn.executescript("""
+            CREATE TRIGGER IF NOT EXISTS titles_ai AFTER INSERT ON titles BEGIN
+                INSERT INTO titles_fts(rowid, title) VALUES (new.id, new.title);
+            END;
+            CREATE TRIGGER IF NOT EXISTS titles_ad AFTER DELETE ON titles BEGIN
+                INSERT INTO titles_fts(titles_fts, rowid, title) VALUES ('delete', old.id, old.title);
+            END;
+            CREATE TRIGGER IF NOT EXISTS titles_au AFTER UPDATE OF title ON titles BEGIN
+                INSERT INTO titles_fts(titles_fts, rowid, title) VALUES ('delete', old.id, old.title);
+                INSERT INTO titles_fts(rowid, title) VALUES (new.id, new.title);
+            END;
+        """)
+        return True
+
+    def add(self, results):
+        """Record (or refresh) a batch of listing ScrapeResults."""
+        now = time.time()
+        rows = [(result.url, result.site, result.title, now) for result in results]
+        if not rows:
+            return
+        try:
+            with self._lock, self._conn:
+                self._conn.executemany(
+                    "INSERT INTO titles (url, site, title, seen_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(url) DO UPDATE SET site = excluded.site, title = excluded.title, seen_at = excluded.seen_at",
+                    rows,
+                )
+        except sqlite3.Error as e:
+            # The index is only an accelerator; a failed write must not fail the scrape
+            logger.error("Error indexing %s titles: %s", len(rows), e)
+
+    def _candidates(self, grams, site):
+        site_clause = " AND t.site = ?" if site else ""
+        params = [site] if site else []
+        # Words under three letters are only reachable through LIKE
+        fts_grams = [gram for gram in grams if len(gram) == 3]
+        if self.fts and fts_grams:
+            query = " OR ".join(f'"{gram}"' for gram in fts_grams)
+            sql = (
+                "SELECT t.url, t.site, t.title, t.seen_at FROM titles_fts f JOIN titles t ON t.id = f.rowid "
+                f"WHERE titles_fts MATCH ?{site_clause} ORDER BY f.rank LIMIT ?"
+            )
+            return self._conn.execute(sql, [query] + params + [CANDIDATE_LIMIT]).fetchall()
+        likes = " OR ".join("t.title LIKE ?" for _ in grams)
+        sql = f"SELECT t.url, t.site, t.title, t.seen_at FROM titles t WHERE ({likes}){site_clause} LIMIT ?"
+        return self._conn.execute(sql, [f"%{gram}%" for gram in grams] + params + [CANDIDATE_LIMIT * 5]).fetchall()
+
+    def search(self, text, site=None, limit=50):
+        """Return up to limit ScrapeResults whose titles match text, best first."""
+        grams = _trigrams(text)
+        if not grams:
+            return []
+        started = time.perf_counter()
+        with self._lock:
+            rows = self._candidates(grams, site)
+
+        scored = []
+        for url, row_site, title, seen_at in rows:
+            score = _score(grams, title)
+            if score >= self.min_score:
+                scored.append((score, seen_at, url, row_site, title))
+        scored.sort(key=lambda match: (match[0], match[1]), reverse=True)
+        logger.debug(
+            "Title index: %s matches for %r among %s candidates in %.1f ms",
+            len(scored), text, len(rows), (time.perf_counter() - started) * 1000,
+        )
+        return [
+            ScrapeResult(title, url, row_site, rank)
+            for rank, (_, _, url, row_site, title) in enumerate(scored[:limit], 1)
+        ]
+
+    def purge(self):
+        """Forget titles not seen in any listing for max_age seconds."""
+        with self._lock, self._conn:
+            deleted = self._conn.execute(
+                "DELETE FROM titles WHERE seen_at < ?", (time.time() - self.max_age,)
+            ).rowcount
+        if deleted:
+            logger.info(f"Purged {deleted} stale titles from the title index")
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM titles").fetchone()[0]
+
+TITLE_INDEX = TitleIndex(TITLE_INDEX_PATH)
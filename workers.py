@@ -0,0 +1,127 @@
+import json
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from telegram import Bot, Update
+from config import WORKERS, WORKER_QUEUE_SIZE, TELEGRAM_BOT_TOKEN, reload_site_config, logger
+
+# Seconds the receiver waits on a full worker queue before asking Telegram to retry
+ENQUEUE_TIMEOUT = 2
+
+# Seconds between checks that every worker process is still alive
+SUPERVISE_INTERVAL = 5
+
+def update_user_id(data):
+    """The id of the user (or chat) an update comes from, for routing; 0 if it has none."""
+    for value in data.values():
+        if isinstance(value, dict):
+            sender = value.get('from') or value.get('chat') or value.get('user')
+            if sender:
+                return sender['id']
+    return 0
+
+class _WebhookHandler(BaseHTTPRequestHandler):
+    # Set by serve(): the URL path Telegram posts to, and one queue per worker
+    path_token = None
+    queues = ()
+
+    def do_POST(self):
+        if self.path.rstrip('/') != self.path_token:
+            self.send_error(404)
+            return
+        try:
+            data = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        except ValueError:
+            self.send_error(400)
+            return
+        # One user's updates always go to the same worker, so they are handled in order
+        worker = update_user_id(data) % len(self.queues)
+        try:
+            self.queues[worker].put(data, timeout=ENQUEUE_TIMEOUT)
+        except queue.Full:
+            logger.warning("Worker %s queue is full; asking Telegram to resend update %s", worker, data.get('update_id'))
+            self.send_error(503)
+            return
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+def run_worker(index, updates, setup):
+    """Worker process: build the bot with setup(index) and dispatch the updates routed to it.
+
+    The site config is re-read before every update (one stat() when it is
+    unchanged), so a /update_domain handled by another worker applies here
+    from the next update on.
+    """
+    updater = setup(index)
+    dispatcher = updater.dispatcher
+    updater.job_queue.start()
+    threading.Thread(target=dispatcher.start, name=f"dispatcher-{index}", daemon=True).start()
+    logger.info(f"Worker {index} ready (pid {os.getpid()})")
+    try:
+        while True:
+            data = updates.get()
+            if data is None:
+                break
+            reload_site_config()
+            dispatcher.update_queue.put(Update.de_json(data, updater.bot))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        updater.job_queue.stop()
+        dispatcher.stop()
+    logger.info(f"Worker {index} stopped")
+
+def _start_worker(context, index, updates, setup):
+    process = context.Process(target=run_worker, args=(index, updates, setup), name=f"worker-{index}", daemon=True)
+    # The child inherits the environment it starts with; config.py gives it a log file of its own
+    os.environ['WORKER_INDEX'] = str(index)
+    try:
+        process.start()
+    finally:
+        del os.environ['WORKER_INDEX']
+    return process
+
+def serve(setup, port, webhook_url, workers=WORKERS):
+    """Receive Telegram's webhook here and hand each update to one of `workers` processes.
+
+    Workers are spawned, not forked, so each opens its own SQLite connections
+    and threads; everything they share (sessions, results, title index, link
+    cache, rate limits, site config) lives in files on this host. setup must be
+    a module-level function, since it is pickled by reference for the workers.
+    A worker that dies is restarted on the same queue.
+    """
+    context = multiprocessing.get_context('spawn')
+    queues = [context.Queue(WORKER_QUEUE_SIZE) for _ in range(workers)]
+    processes = [_start_worker(context, index, updates, setup) for index, updates in enumerate(queues)]
+
+    _WebhookHandler.path_token = f"/{TELEGRAM_BOT_TOKEN}"
+    _WebhookHandler.queues = queues
+    server = ThreadingHTTPServer(('0.0.0.0', port), _WebhookHandler)
+    threading.Thread(target=server.serve_forever, name='webhook-http', daemon=True).start()
+    Bot(TELEGRAM_BOT_TOKEN).set_webhook(url=f"{webhook_url}/{TELEGRAM_BOT_TOKEN}")
+    logger.info(f"Receiving webhook on port {port} for {workers} workers")
+
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+    try:
+        while not stopping.wait(SUPERVISE_INTERVAL):
+            for index, process in enumerate(processes):
+                if not process.is_alive():
+                    logger.error(f"Worker {index} exited with code {process.exitcode}; restarting it")
+                    processes[index] = _start_worker(context, index, queues[index], setup)
+    except KeyboardInterrupt:
+        pass
+
+    logger.info("Stopping webhook receiver and workers")
+    server.shutdown()
+    for updates in queues:
+        updates.put(None)
+    for process in processes:
+        process.join(timeout=10)